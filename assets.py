@@ -1,12 +1,18 @@
-from os import path
-from pygame import Rect, image, transform, font
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from json import loads
+from os import cpu_count, path
+from threading import Lock
+from zlib import crc32
+from pygame import Rect, display, image, transform, font
 from pygame.surface import Surface
-from typing import Optional, Any
+from typing import Optional, Any, Callable
 
 class Font(font.Font):
     pass
 
 FONT = "freesansbold.ttf"
+TEXT_SIZE = 25 # Default text size of images
 ASSET_DIR = path.join(".", "asset")
 
 # ----------> Button files <----------------------------------------
@@ -45,11 +51,236 @@ HOUSE = path.join(ASSET_DIR, "house.png")
 GRANARY = path.join(ASSET_DIR, "granary.png")
 STORAGE = path.join(ASSET_DIR, "storage.png")
 
+# ----------> Atlas <----------------------------------------
+# Buttons and icons packed in a single picture, built by atlas.py
+
+ATLAS_IMAGE = path.join(ASSET_DIR, "atlas.png")
+ATLAS_INDEX = path.join(ASSET_DIR, "atlas.json")
+
+class Atlas:
+    def __init__(self, image_path: str = ATLAS_IMAGE, index_path: str = ATLAS_INDEX) -> None:
+        self.image_path = image_path # Packed picture
+        self.index_path = index_path # JSON with region of every picture
+        self.surface: Surface = None # Packed picture, loaded at first use
+        self.converted = False # If True surface is in display pixel format, done once display is ready
+        self.regions: dict = None # Region of every picture by file name
+        self.lock = Lock() # Pictures can be loaded by preloader threads
+
+    def load(self) -> None:
+        """ Load index and packed picture, pictures changed after building the atlas are not used """
+        regions = {}
+        try:
+            with open(self.index_path, 'r') as file:
+                index = loads(file.read())
+            self.surface = image.load(self.image_path)
+        except (OSError, ValueError):
+            index = {} # No atlas, pictures are loaded from their file
+        for name, region in index.items():
+            if is_fresh(path.join(path.dirname(self.image_path), name), region):
+                regions[name] = Rect(region["rect"])
+        self.regions = regions
+
+    def get(self, picture_path: str) -> Surface:
+        """ Return a picture as a region of the packed picture, None if it is not in atlas """
+        with self.lock:
+            if self.regions == None:
+                self.load()
+            if not self.converted and self.surface != None and display.get_surface() != None:
+                self.surface = convert(self.surface)
+                self.converted = True
+        if path.normpath(path.dirname(picture_path)) != path.normpath(path.dirname(self.image_path)):
+            return None
+        region = self.regions.get(path.basename(picture_path))
+        return None if region == None else self.surface.subsurface(region)
+
+def is_fresh(source: str, region: dict) -> bool:
+    """ Return True if a picture file is the one packed in atlas: same size and modification time,
+        or same checksum when only the time changed, as after a checkout or a copy """
+    try:
+        if path.getsize(source) != region["file_size"]:
+            return False
+        if path.getmtime(source) == region["mtime"]:
+            return True
+        with open(source, 'rb') as file:
+            return crc32(file.read()) == region["crc"]
+    except (OSError, KeyError): # Missing picture or index built by an older atlas.py
+        return False
+
+ATLAS = Atlas()
+
+# ----------> Cache <----------------------------------------
+
+SURFACE_CACHE_SIZE = 128 # Max number of scaled surfaces kept in memory
+TEXT_CACHE_SIZE = 256 # Max number of rendered text kept in memory
+
+class LruCache:
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize # Max number of entries, the least recently used is evicted
+        self.entries = OrderedDict()
+        self.hits = 0 # Number of lookup found in cache
+        self.misses = 0 # Number of lookup that had to build the value
+
+    def get(self, key: Any, build: Callable[[], Any]) -> Any:
+        """ Return value for key, if missing build it with build() and store it """
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        value = self.entries[key] = build()
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last = False)
+        return value
+
+    def clear(self) -> None:
+        """ Remove all entries and reset counters """
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+SURFACE_CACHE = LruCache(SURFACE_CACHE_SIZE) # Shared by all images, key is (path, width, height)
+
+TEXT_CACHE = LruCache(TEXT_CACHE_SIZE) # Shared by all images, key is (text, size, color)
+FONTS = {} # Font objects by size, building one means parsing the font file
+
+def get_font(size: int) -> Font:
+    """ Return the font for a size, it is built only the first time """
+    if size not in FONTS:
+        FONTS[size] = Font(FONT, size)
+    return FONTS[size]
+
+def cached_text(text: str, size: int, color: tuple) -> Surface:
+    """ Return a text rendered with a size and a color, the surface is shared so don't draw on it """
+    return TEXT_CACHE.get((text, size, color), lambda: get_font(size).render(text, True, color))
+
+def cached_image(path: str, size: Any) -> Surface:
+    """ Return an image loaded and scaled to a size, the surface is shared so don't draw on it """
+    key = (path, int(size[0]), int(size[1]))
+    return SURFACE_CACHE.get(key, lambda: preloaded(key) if is_preloaded(key) else load_scaled(*key))
+
+def load_scaled(path: str, w: int, h: int) -> Surface:
+    """ Return an image loaded and scaled to a size """
+    return scale_image(load_image(path), (w, h))
+
+# ----------> Preloader <----------------------------------------
+
+PRELOAD_WORKERS = min(4, cpu_count() or 1)
+
+def copy_result(done: Future, future: Future) -> None:
+    """ Give result of a finished future to another future, or its error so waiting for it doesn't hang """
+    if future.done(): # Cancelled by Preloader.close()
+        return
+    if done.cancelled():
+        future.cancel()
+    elif done.exception() != None:
+        future.set_exception(done.exception())
+    else:
+        future.set_result(done.result())
+
+class Preloader:
+    def __init__(self, workers: int = PRELOAD_WORKERS, on_progress: Callable[[int, int], None] = None) -> None:
+        self.executor = ThreadPoolExecutor(max_workers = workers, thread_name_prefix = "preload")
+        self.futures = {} # Pictures in loading or loaded but not used yet, key is (path, width, height)
+        self.on_progress = on_progress # Called from loading threads with (loaded, requested)
+        self.requested = 0 # Number of pictures requested
+        self.loaded = 0 # Number of pictures loaded
+        self.lock = Lock()
+        self.paused = False # If True requests wait until resume(), for pictures not needed in first frame
+        self.waiting = [] # Requests done while paused
+
+    def request(self, path: str, size: Any) -> None:
+        """ Start loading a picture scaled to a size in background, requests are served in order """
+        key = (path, int(size[0]), int(size[1]))
+        if key in self.futures or key in SURFACE_CACHE.entries:
+            return
+        self.requested += 1
+        self.futures[key] = Future()
+        if self.paused:
+            self.waiting.append(key)
+        else:
+            self.submit(key)
+
+    def submit(self, key: tuple) -> None:
+        """ Load a picture in a loading thread and give result to its future """
+        future = self.futures[key]
+        self.executor.submit(self.load, *key).add_done_callback(lambda done: copy_result(done, future))
+
+    def pause(self) -> None:
+        """ Keep next requests waiting until resume() """
+        self.paused = True
+
+    def resume(self) -> None:
+        """ Start loading waiting requests """
+        self.paused = False
+        for key in self.waiting:
+            self.submit(key)
+        self.waiting = []
+
+    def load(self, path: str, w: int, h: int) -> Surface:
+        """ Load a picture, runs in a loading thread, a picture that fails is counted as loaded
+            so is_done() still becomes True, its error is raised by take() """
+        try:
+            return load_scaled(path, w, h)
+        finally:
+            with self.lock:
+                self.loaded += 1
+                loaded, requested = self.loaded, self.requested
+            if self.on_progress != None:
+                self.on_progress(loaded, requested)
+
+    def take(self, key: tuple) -> Surface:
+        """ Return a requested picture waiting for it if needed, None if it was not requested """
+        future: Future = self.futures.pop(key, None)
+        if future == None:
+            return None
+        if key in self.waiting: # Needed now, load it in this thread
+            self.waiting.remove(key)
+            future.set_result(self.load(*key))
+        return future.result()
+
+    def progress(self) -> tuple:
+        """ Return number of pictures loaded and requested """
+        return self.loaded, self.requested
+
+    def is_done(self) -> bool:
+        """ Return True if all requested pictures are loaded """
+        return self.loaded >= self.requested
+
+    def close(self) -> None:
+        """ Stop loading threads, pictures not loaded yet are cancelled, used when a preloader is replaced """
+        self.executor.shutdown(wait = False, cancel_futures = True)
+        for future in self.futures.values():
+            future.cancel()
+
+PRELOADER: Preloader = None # If set, new images load their picture in background
+
+def start_preloading(on_progress: Callable[[int, int], None] = None) -> Preloader:
+    """ Make new images load their picture in background, return the preloader """
+    global PRELOADER
+    PRELOADER = Preloader(on_progress = on_progress)
+    return PRELOADER
+
+def is_preloaded(key: tuple) -> bool:
+    """ Return True if a picture was requested to preloader """
+    return PRELOADER != None and key in PRELOADER.futures
+
+def preloaded(key: tuple) -> Surface:
+    """ Return a picture requested to preloader, waiting for it if needed """
+    return PRELOADER.take(key)
+
 # ----------> Image <----------------------------------------
 
+def convert(surface: Surface) -> Surface:
+    """ Convert a surface to display pixel format for faster drawing, if display is ready """
+    return surface.convert_alpha() if display.get_surface() != None else surface
+
 def load_image(path: str) -> Surface:
-    """ Load an image from a file """
-    return image.load(path)
+    """ Load an image from atlas or from a file """
+    picture = ATLAS.get(path)
+    return convert(image.load(path)) if picture == None else picture
 
 def scale_image(surface: Surface,
                 size: Any,
@@ -61,7 +292,7 @@ def scale_image(surface: Surface,
 
 class Image:
     def __init__(self, path: str, x: float, y: float, w: float, h: float, 
-                 text: str = "", text_x: float = 0.5, text_y: float = 0.5, text_size: int = 25) -> None:
+                 text: str = "", text_x: float = 0.5, text_y: float = 0.5, text_size: int = TEXT_SIZE) -> None:
         self.path = path # Image relative path
         self.x = x # X positioning, if x ↑ image →
         self.y = y # Y positioning, if y ↑ image ↓
@@ -74,15 +305,38 @@ class Image:
         self.textSize = text_size # Default text size
         self.textRect: Rect = None # Needed to display text
         self.text_clipping_area: Rect = None # Clipping area for not showing part of a button
+        self.rendered: tuple = None # Text, size and color of last rendered text
+        self.dirty = True # True if picture, text or position changed since last draw
+        self._picture: Surface = None
+        self.picture_size: tuple = None # If set picture is loaded at first use with this path and size
 
-        self.change(self.path)
+        if PRELOADER != None: # Picture is loaded in background while other images are created
+            PRELOADER.request(self.path, (self.w, self.h))
+            self.picture_size = (self.path, (self.w, self.h))
+        else:
+            self.change(self.path)
         self.set_text(text)
 
+    @property
+    def picture(self) -> Surface:
+        if self.picture_size != None:
+            self.picture = cached_image(*self.picture_size)
+        return self._picture
+
+    @picture.setter
+    def picture(self, picture: Surface) -> None:
+        self._picture = picture
+        self.picture_size = None
+
     def set_text(self, text: str, color: tuple = (0, 0, 0)) -> None:
         """ Set text over image, default color: black """
         if text != "":
-            self.text = Font(FONT, self.textSize).render(str(text), True, color)
-            self.textRect = self.text.get_rect()
+            rendered = (str(text), self.textSize, tuple(color))
+            if rendered != self.rendered: # Render only if text is changed
+                self.text = cached_text(*rendered)
+                self.textRect = self.text.get_rect()
+                self.rendered = rendered
+                self.dirty = True
             avg = lambda xy, wh: (2 * xy + wh) / 2
             self.textRect.center = (avg(self.x, self.w) - (0.5 - self.text_x) * self.w, avg(self.y, self.h) - (self.textSize / 10) - (0.5 - self.text_y) * self.h)
     
@@ -90,10 +344,16 @@ class Image:
         """ Change default text size """
         self.textSize = textSize
 
-    def change(self, path: str = "") -> None:
+    def change(self, path: str = "", writable: bool = False) -> None:
         """ Change picture of image,
-            note that you have to change picture before drawing it """
-        self.picture = scale_image(load_image(self.path if path == "" else path), (self.w, self.h))
+            note that you have to change picture before drawing it,
+            use writable if you are going to draw over the picture """
+        picture = cached_image(self.path if path == "" else path, (self.w, self.h))
+        if writable: # Cached surface is shared with other images, draw on a copy
+            picture = picture.copy()
+        if picture is not self._picture:
+            self.picture = picture
+            self.dirty = True
 
     def draw(self, display, clipping_area: tuple = None, text = "") -> None:
         """ Display image on screen based on the menu,
@@ -104,6 +364,13 @@ class Image:
             self.set_text(text)
         if self.text != "":
             display.blit(self.text, self.textRect)
+        if self.dirty and isinstance(display, Scene):
+            display.invalidate(self.rect())
+        self.dirty = False
+
+    def rect(self) -> Rect:
+        """ Return area covered by image """
+        return Rect(self.x, self.y, self.w, self.h)
 
     def collide(self, p: tuple) -> bool:
         """ Return True if mouse collide with button """
@@ -111,5 +378,66 @@ class Image:
 
     def move(self, right: float = 0, down: float = 0, lock: bool = False, max_w: float = 0, max_h: float = 0) -> None:
         """ Move the image of right →, down ↓ pixels """
+        x, y = self.x, self.y
         self.x = min(max(0, self.x + right), max_w - self.w) if lock else self.x + right
-        self.y = min(max(0, self.y + down), max_h - self.h) if lock else self.y + down
\ No newline at end of file
+        self.y = min(max(0, self.y + down), max_h - self.h) if lock else self.y + down
+        self.dirty = self.dirty or (x, y) != (self.x, self.y)
+
+# ----------> Scene <----------------------------------------
+
+class Scene:
+    def __init__(self, display: Surface) -> None:
+        self.display = display # Surface shown on screen
+        self.blits = [] # Blits of current frame as (surface, rect, area)
+        self.previous = {} # Blits of previous frame, keys are (surface id, rect, area)
+        self.dirty = [] # Areas to draw again even if blits are the same
+        self.full = True # Draw again all the display
+
+    def blit(self, surface: Surface, dest: Any, area: Rect = None) -> None:
+        """ Same as Surface.blit() but only remember the blit, display is drawn by render() """
+        size = surface.get_size() if area == None else Rect(area).clip(surface.get_rect()).size
+        self.blits.append((surface, Rect((int(dest[0]), int(dest[1])), size), None if area == None else Rect(area)))
+
+    def invalidate(self, rect: Rect = None) -> None:
+        """ Mark an area to draw again in next frame, all the display if rect is None """
+        if rect == None:
+            self.full = True
+        else:
+            self.dirty.append(Rect(rect))
+
+    def changed_areas(self) -> list:
+        """ Return areas where a blit was added, removed, moved or changed since previous frame """
+        current = {(id(surface), tuple(rect), None if area == None else tuple(area)): rect for surface, rect, area in self.blits}
+        changed = [rect for key, rect in current.items() if key not in self.previous]
+        changed += [rect for key, (rect, _) in self.previous.items() if key not in current]
+        return changed
+
+    def render(self) -> list:
+        """ Draw again changed areas of the display and return them, for pygame.display.update() """
+        screen = self.display.get_rect()
+        areas = [screen] if self.full else merge_rects(self.changed_areas() + self.dirty)
+        areas = [area.clip(screen) for area in areas if area.colliderect(screen)]
+        if sum(area.w * area.h for area in areas) > screen.w * screen.h // 2:
+            areas = [screen] # Faster to draw all at once
+        for area in areas:
+            self.display.set_clip(area)
+            for surface, rect, clipping_area in self.blits:
+                if rect.colliderect(area):
+                    self.display.blit(surface, rect.topleft, clipping_area)
+        self.display.set_clip(None)
+        # Keep surfaces of previous frame alive so their id is not reused
+        self.previous = {(id(surface), tuple(rect), None if area == None else tuple(area)): (rect, surface) for surface, rect, area in self.blits}
+        self.blits, self.dirty, self.full = [], [], False
+        return areas
+
+def merge_rects(rects: list) -> list:
+    """ Return a list of rect where overlapping rects are replaced by their union """
+    merged = []
+    for rect in rects:
+        rect = Rect(rect)
+        overlap = rect.collidelist(merged)
+        while overlap != -1:
+            rect.union_ip(merged.pop(overlap))
+            overlap = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
\ No newline at end of file
@@ -0,0 +1,54 @@
+from json import dumps
+from os import listdir, path
+from zlib import crc32
+import pygame
+from assets import ASSET_DIR, ATLAS_IMAGE, ATLAS_INDEX
+
+# Build the texture atlas: all buttons and icons in asset/ are packed in one image,
+# run again after changing a picture, backgrounds are too big and are left out
+
+ATLAS_WIDTH = 1024
+PADDING = 1 # Pixels between two pictures
+
+def sources() -> list:
+    """ Return file names of pictures to pack """
+    excluded = {path.basename(ATLAS_IMAGE)}
+    return sorted(name for name in listdir(ASSET_DIR)
+                  if name.endswith(".png") and not name.startswith("background") and name not in excluded)
+
+def pack(sizes: dict, width: int = ATLAS_WIDTH) -> tuple:
+    """ Place pictures in rows from the tallest, return position of every picture and atlas height """
+    positions = {}
+    x, y, row_height = 0, 0, 0
+    for name, (w, h) in sorted(sizes.items(), key = lambda item: (-item[1][1], item[0])):
+        if x + w > width: # Start a new row
+            x, y, row_height = 0, y + row_height + PADDING, 0
+        positions[name] = (x, y)
+        x += w + PADDING
+        row_height = max(row_height, h)
+    return positions, y + row_height
+
+def build() -> None:
+    """ Pack pictures in ATLAS_IMAGE and write their regions in ATLAS_INDEX """
+    pictures = {name: pygame.image.load(path.join(ASSET_DIR, name)) for name in sources()}
+    positions, height = pack({name: picture.get_size() for name, picture in pictures.items()})
+    atlas = pygame.Surface((ATLAS_WIDTH, height), pygame.SRCALPHA)
+    regions = {}
+    for name, picture in pictures.items():
+        atlas.blit(picture, positions[name])
+        source = path.join(ASSET_DIR, name)
+        with open(source, 'rb') as file:
+            checksum = crc32(file.read())
+        regions[name] = { # Size, time and checksum of the file are for finding out if atlas is old
+            "rect": [*positions[name], *picture.get_size()],
+            "file_size": path.getsize(source),
+            "mtime": path.getmtime(source),
+            "crc": checksum
+        }
+    pygame.image.save(atlas, ATLAS_IMAGE)
+    with open(ATLAS_INDEX, 'w') as file:
+        file.write(dumps(regions, indent = 2))
+    print(f"{len(regions)} pictures packed in {ATLAS_WIDTH}x{height} {ATLAS_IMAGE}")
+
+if __name__ == "__main__":
+    build()
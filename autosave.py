@@ -0,0 +1,61 @@
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from time import monotonic
+from engine import Game
+from savefile import SAVE_FILE, write_save
+import events
+
+AUTOSAVE_INTERVAL = 5 # In seconds, minimum time between two saves
+LOGGER = getLogger(__name__)
+
+class Autosave:
+    def __init__(self, interval: float = AUTOSAVE_INTERVAL, path: str = SAVE_FILE) -> None:
+        self.interval = interval # Minimum seconds between two saves
+        self.path = path # Save file path
+        self.executor = ThreadPoolExecutor(max_workers = 1) # Write on a worker, one save at a time
+        self.pending = None # Future of the save in progress
+        self.last_save = monotonic() # Time of last save
+        self.last_data: dict = None # Last saved stats without time, for checking if game is changed
+        self.saves = 0 # Number of save written
+
+    def snapshot(self, game: Game) -> dict:
+        """ Save current time in game and return game stats """
+        game.time = events.current_time()
+        return game.serialize()
+
+    def is_dirty(self, data: dict) -> bool:
+        """ Return True if game stats are changed from last save, time is not considered """
+        stats = {key: value for key, value in data.items() if key != "time"}
+        if stats == self.last_data:
+            return False
+        self.last_data = stats
+        return True
+
+    def check_save(self) -> None:
+        """ Report a finished save that failed, the game is then seen as changed so next tick saves it again """
+        if self.pending is not None and self.pending.exception() != None:
+            LOGGER.error("Saving %s failed", self.path, exc_info = self.pending.exception())
+            self.last_data = None
+        self.pending = None
+
+    async def tick(self, game: Game) -> None:
+        """ Called every frame, save the game if interval is passed and game is changed,
+            file is written on the worker thread so the frame is not blocked """
+        if monotonic() - self.last_save < self.interval:
+            return
+        if self.pending is not None and not self.pending.done():
+            return # Previous save still in progress, coalesce with next one
+        self.check_save()
+        self.last_save = monotonic()
+        data = self.snapshot(game)
+        if self.is_dirty(data):
+            self.pending = self.executor.submit(write_save, data, self.path) # Not an asyncio future, game loop never yields
+            self.saves += 1
+
+    def flush(self, game: Game) -> None:
+        """ Wait for pending save and write current game, used when closing the game """
+        self.executor.shutdown(wait = True)
+        self.check_save()
+        write_save(self.snapshot(game), self.path)
+        self.saves += 1
+        self.executor = ThreadPoolExecutor(max_workers = 1)
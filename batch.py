@@ -0,0 +1,157 @@
+from argparse import ArgumentParser
+from datetime import timedelta
+from json import dumps
+import numpy as np
+import events
+from engine import FRAME_PER_SECOND, repeat_tick
+from savefile import parse_save
+
+# Simulate many saves at once for balance analysis, every stat is a NumPy array with a value per game,
+# rules are the same of engine.Game, timed events are kept as loaded and are not simulated,
+# games producing half of 0.01 per tick are moved one game at a time with engine.repeat_tick(), as Game does,
+# exported saves have their time moved forward of simulated seconds so loading them doesn't produce it again
+
+def production(workers: np.ndarray) -> np.ndarray:
+    """ Same as Game.production() for an array of workers """
+    return workers ** 1.05 * (1 + (workers // 10) * 0.5)
+
+def is_half_step(step: np.ndarray) -> np.ndarray:
+    """ Return True where step is half of 0.01, there rounding depends on value (see engine.repeat_tick()) """
+    return np.abs(np.abs(step * 100) % 1 - 0.5) <= 1e-6
+
+def round_hundredths(values: np.ndarray, exact: np.ndarray) -> np.ndarray:
+    """ Round to 0.01, where exact is True use round() as Game does, NumPy rounding differs near half of 0.01 """
+    rounded = np.round(values, 2)
+    for index in np.flatnonzero(exact):
+        rounded[index] = round(float(values[index]), 2)
+    return rounded
+
+def advanced_time(time: str, seconds: float) -> str:
+    """ Return a saved time moved forward of some seconds, empty if the save has no time """
+    return "" if time == "" else events.set_time(events.get_time(time) + timedelta(seconds = seconds))
+
+class BatchGame:
+    def __init__(self, saves: list) -> None:
+        self.fps = FRAME_PER_SECOND
+        self.saves = saves # Loaded dictionaries, used for fields not simulated when exporting
+        self.seconds = 0.0 # Game time simulated since loading, added to saved time when exporting
+        self.population = np.array([save["population"] for save in saves], dtype = np.int64)
+        self.food = np.array([save["resource"]["food"] for save in saves], dtype = np.float64)
+        self.wood = np.array([save["resource"]["wood"] for save in saves], dtype = np.float64)
+        self.harvester = np.array([save["occupation"]["harvester"] for save in saves], dtype = np.int64)
+        self.lumber = np.array([save["occupation"]["lumber"] for save in saves], dtype = np.int64)
+        self.house = np.array([save["building"]["house"] for save in saves], dtype = np.int64)
+        self.granary = np.array([save["building"]["granary"] for save in saves], dtype = np.int64)
+        self.storage = np.array([save["building"]["storage"] for save in saves], dtype = np.int64)
+
+    @classmethod
+    def load(cls, paths: list):
+        """ Load saves from a list of files, JSON or binary """
+        saves = []
+        for path in paths:
+            with open(path, 'rb') as file:
+                saves.append(parse_save(file.read()))
+        return cls(saves)
+
+    def serialize(self) -> list:
+        """ Return a list of dictionaries in Game.serialize() format """
+        saves = []
+        for index, save in enumerate(self.saves):
+            saves.append({
+                "population": int(self.population[index]),
+                "resource": {
+                    "food": float(self.food[index]),
+                    "wood": float(self.wood[index])
+                    },
+                "building": {
+                    "house": int(self.house[index]),
+                    "granary": int(self.granary[index]),
+                    "storage": int(self.storage[index])
+                    },
+                "occupation": {
+                    "harvester": int(self.harvester[index]),
+                    "lumber": int(self.lumber[index])
+                    },
+                "time": advanced_time(save.get("time", ""), self.seconds),
+                "events": save.get("events", [])
+                })
+        return saves
+
+    def __len__(self) -> int:
+        return len(self.saves)
+
+    # ----------> Production <----------------------------------------
+
+    def harvester_production(self) -> np.ndarray:
+        """ Same as Game.harvester_production() for every game """
+        return production(self.harvester) - 0.1 * self.population
+
+    def lumber_production(self) -> np.ndarray:
+        """ Same as Game.lumber_production() for every game """
+        return production(self.lumber) * 0.8
+
+    def food_limit(self) -> np.ndarray:
+        """ Same as Game.food_limit() for every game """
+        return np.round((1 + self.granary) ** 1.5) * 1000
+
+    def wood_limit(self) -> np.ndarray:
+        """ Same as Game.wood_limit() for every game """
+        return 10000.0 * (1 + self.storage)
+
+    def tick(self, active: np.ndarray = None, multiplier: float = 1) -> None:
+        """ Same as Game.mine() for games where active is True (default all games) """
+        active = np.ones(len(self), dtype = bool) if active is None else active
+        food_step = self.harvester_production() * multiplier / self.fps
+        wood_step = self.lumber_production() * multiplier / self.fps
+        food = round_hundredths(np.minimum(self.food + food_step, self.food_limit()), active & is_half_step(food_step))
+        wood = round_hundredths(np.minimum(self.wood + wood_step, self.wood_limit()), active & is_half_step(wood_step))
+        self.food = np.where(active, food, self.food)
+        self.wood = np.where(active, wood, self.wood)
+        starving = active & (self.food < -100) # Population is reduced
+        self.food[starving] = 0
+        self.population[starving] = np.maximum(0, self.population[starving] - 1)
+        no_unemployed = starving & (self.population - self.harvester - self.lumber <= 0)
+        more_lumber = no_unemployed & (self.lumber >= self.harvester)
+        self.lumber[more_lumber] -= 1
+        self.harvester[no_unemployed & ~more_lumber] -= 1
+
+    def advance(self, seconds: float, multiplier: float = 1) -> None:
+        """ Move all games forward of some seconds, same as Game.produce(): a tick is done one by one,
+            then food and wood move of a fixed step for all ticks before starvation """
+        remaining = np.full(len(self), int(round(seconds * self.fps)), dtype = np.int64)
+        self.seconds += seconds
+        while (remaining > 0).any():
+            active = remaining > 0
+            self.tick(active, multiplier)
+            remaining -= active
+            food_step = self.harvester_production() * multiplier / self.fps
+            wood_step = self.lumber_production() * multiplier / self.fps
+            half = active & (is_half_step(food_step) | is_half_step(wood_step))
+            food_hundredths, wood_hundredths = np.round(self.food * 100), np.round(self.wood * 100)
+            food_tick, wood_tick = food_step, wood_step
+            food_step, wood_step = np.round(food_step * 100), np.round(wood_step * 100)
+            steps = remaining.copy()
+            starving = food_step < 0 # Stop before food < -100, that tick is done by tick()
+            steps[starving] = np.minimum(steps[starving], (food_hundredths[starving] + 100 * 100) // -food_step[starving]).astype(np.int64)
+            steps = np.where(active & ~half, steps, 0)
+            food_limit, wood_limit = self.food_limit(), self.wood_limit()
+            food = np.round(np.minimum(food_hundredths + steps * food_step, food_limit * 100) / 100, 2)
+            wood = np.round(np.minimum(wood_hundredths + steps * wood_step, wood_limit * 100) / 100, 2)
+            self.food = np.where(steps > 0, food, self.food)
+            self.wood = np.where(steps > 0, wood, self.wood)
+            for index in np.flatnonzero(half): # Few games, rounding of each value matters (see engine.repeat_tick())
+                self.food[index], steps[index] = repeat_tick(float(self.food[index]), float(food_tick[index]), float(food_limit[index]), int(remaining[index]), -100)
+                self.wood[index], steps[index] = repeat_tick(float(self.wood[index]), float(wood_tick[index]), float(wood_limit[index]), int(steps[index]))
+            remaining -= steps
+
+def main() -> None:
+    parser = ArgumentParser(description = "Move many saves forward at once")
+    parser.add_argument("saves", nargs = "+", help = "save files")
+    parser.add_argument("--seconds", type = float, default = 60 * 60, help = "game time to simulate")
+    args = parser.parse_args()
+    games = BatchGame.load(args.saves)
+    games.advance(args.seconds)
+    print(dumps(games.serialize()))
+
+if __name__ == "__main__":
+    main()
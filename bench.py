@@ -0,0 +1,64 @@
+from argparse import ArgumentParser
+from gc import get_stats
+from time import perf_counter
+import tracemalloc
+from simulate import SCENARIOS, Simulation
+
+BENCH_SECONDS = 300 # Game time simulated for every scenario
+
+def gc_collections() -> int:
+    """ Return number of garbage collections done, grows with the number of objects allocated """
+    return sum(generation["collections"] for generation in get_stats())
+
+def bench(name: str, seconds: float, advance: bool = False) -> dict:
+    """ Run a scenario and return ticks per second, seconds spent in every method and allocation stats """
+    game, script = SCENARIOS[name]()
+    simulation = Simulation(game, script, timings = True)
+    run = simulation.fast_forward if advance else simulation.run
+    collections = gc_collections()
+    start = perf_counter()
+    run(seconds)
+    elapsed = perf_counter() - start
+    collections = gc_collections() - collections
+
+    # Second run only for memory, tracing slows down everything
+    game, script = SCENARIOS[name]()
+    traced = Simulation(game, script)
+    tracemalloc.start()
+    traced.fast_forward(seconds) if advance else traced.run(seconds)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "scenario": name,
+        "ticks": simulation.ticks,
+        "seconds": elapsed,
+        "ticks_per_second": simulation.ticks / max(elapsed, 1e-9),
+        "timings": simulation.timings,
+        "derived_hits": simulation.game.derived_hits,
+        "derived_misses": simulation.game.derived_misses,
+        "gc_collections": collections,
+        "peak_memory": peak,
+    }
+
+def report(result: dict) -> str:
+    """ Return a benchmark result formatted for displaying """
+    lines = [f"{result['scenario']}: {result['ticks']} ticks in {result['seconds']:.3f}s, "
+             f"{result['ticks_per_second']:.0f} ticks/s, {result['gc_collections']} gc collections, "
+             f"peak memory {result['peak_memory'] / 1024:.1f} KiB, "
+             f"derived stats {result['derived_hits']} hits {result['derived_misses']} misses"]
+    for method, spent in sorted(result["timings"].items(), key = lambda timing: -timing[1]):
+        lines.append(f"    {method:<22} {spent * 1000:10.2f} ms {spent * 10 ** 9 / max(result['ticks'], 1):10.0f} ns/tick")
+    return "\n".join(lines)
+
+def main() -> None:
+    parser = ArgumentParser(description = "Measure engine tick throughput on standard scenarios")
+    parser.add_argument("scenarios", nargs = "*", default = list(SCENARIOS), help = f"any of {', '.join(SCENARIOS)}")
+    parser.add_argument("--seconds", type = float, default = BENCH_SECONDS, help = "game time to simulate")
+    parser.add_argument("--advance", action = "store_true", help = "use Game.advance() instead of ticking")
+    args = parser.parse_args()
+    for name in args.scenarios:
+        print(report(bench(name, args.seconds, args.advance)))
+
+if __name__ == "__main__":
+    main()
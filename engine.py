@@ -1,19 +1,189 @@
+from datetime import datetime, timedelta
 from enum import Enum, unique
-from json import load, dumps
-from math import log10, floor
+from functools import wraps
+from math import inf, log, floor, ceil, sqrt, frexp
+from operator import attrgetter
+from savefile import read_saves, write_save
 import events
 
 FRAME_PER_SECOND = 60
 OFFLINE_PRODUCTION_MULTIPLIER = 0.8
 MAX_OFFLINE_TIME = 60 * 60 * 24 # In seconds
+MAX_CATCH_UP_TICKS = 30 # Ticks run one by one in a frame, longer delays are computed by Game.advance()
+# Rounding a step of a number of hundredths and a half repeats with value (see repeat_half_tick()): n hundredths are stored
+# as the double nearest to n / 100, between 2 ** (e - 1) and 2 ** e doubles are 2 ** (e - 53) apart so its error is the
+# fractional part of n * 2 ** (53 - e) / 100 = n * 2 ** (51 - e) / 25, it only depends on n modulo 25. While value and
+# value + step have the same exponent their sum is rounded on the same grid, so it's above or under the half the same way
+# for the same n modulo 25, except when the half (2 * n + 1) / 200 is exact in binary (2 * n + 1 multiple of 25):
+# round() then rounds it to even, which depends on n modulo 2
+ROUNDING_PERIOD = 50 # Least common multiple of 25 and 2
 
 def load_game():
-    """ Load a game from a .txt file """
-    try:
-        with open('savegame.txt', 'r') as file:
-            return Game.deserialize(load(file))
-    except:
-        return Game()
+    """ Load a game from a .txt file, if it is damaged load the newest valid backup """
+    for data in read_saves():
+        try:
+            return Game.from_dict(data)
+        except (KeyError, TypeError, ValueError):
+            continue
+    return Game()
+
+def repeat_tick(value: float, step: float, limit: int, ticks: int, minimum: float = None) -> tuple:
+    """ Return value after adding step, capping to limit and rounding to 0.01 for a number of ticks, as autominer() does,
+        and the number of ticks done, stops before value goes under minimum """
+    hundredths = step * 100
+    if abs(abs(hundredths) % 1 - 0.5) > 1e-6: # Value is a multiple of 0.01, every tick adds the same rounded step
+        hundredths, value_hundredths = round(hundredths), round(value * 100)
+        if minimum != None and hundredths < 0:
+            ticks = max(0, min(ticks, (value_hundredths - round(minimum * 100)) // -hundredths)) # No tick if already under minimum
+        return round(min(value_hundredths + ticks * hundredths, limit * 100) / 100, 2), ticks
+    return repeat_half_tick(value, step, limit, ticks, minimum)
+
+def repeat_half_tick(value: float, step: float, limit: int, ticks: int, minimum: float = None) -> tuple:
+    """ Same as repeat_tick() for a step of a number of hundredths and a half, rounding it up or down depends
+        on float error of value: between two powers of two it only depends on value in hundredths modulo
+        ROUNDING_PERIOD (see above), so ticks repeat with a period of at most ROUNDING_PERIOD ticks and whole periods are added at once """
+    margin = abs(round(step * 100)) + 2 # In hundredths, values closer to a power of two, limit or minimum are done tick by tick
+    done, seen = 0, {} # Tick and value in hundredths when a (value modulo period, exponent, sign) was seen
+    while done < ticks: # It stops at first value rounded back to itself
+        next_value = round(min(value + step, limit), 2)
+        if next_value == value:
+            break
+        if minimum != None and next_value < minimum:
+            return value, done
+        value, done = next_value, done + 1
+        hundredths = round(value * 100)
+        exponent = frexp(value)[1]
+        high = 2 ** exponent * 100 - margin # Highest value in hundredths with the same exponent, far from next power
+        low = 2 ** (exponent - 1) * 100 + margin
+        if abs(hundredths) < low or abs(hundredths) > high:
+            continue
+        key = (hundredths % ROUNDING_PERIOD, exponent, value > 0)
+        if key not in seen:
+            seen[key] = done, hundredths
+            continue
+        period, change = done - seen[key][0], hundredths - seen[key][1]
+        if change > 0: # Every value added must stay under the limit and the power of two
+            end = min(high if value > 0 else -low, limit * 100 - margin)
+        else:
+            end = max(low if value > 0 else -high, -inf if minimum == None else minimum * 100 + margin)
+        count = min((ticks - done) // period, int((end - hundredths) // change))
+        if count > 0:
+            value, done = (hundredths + count * change) / 100, done + count * period
+        seen = {}
+    return value, ticks
+
+def rounded_geometric_sum(base: float, ratio: float, first: int, count: int) -> int:
+    """ Return sum of base * ratio ** n for count values of n starting from first, every term rounded as a unit cost is """
+    return sum(int(round(base * ratio ** n)) for n in range(first, first + count))
+
+def geometric_count(base: float, ratio: float, first: int, budget: float) -> int:
+    """ Return how many terms of rounded_geometric_sum() can be paid with a budget """
+    if budget < int(round(base * ratio ** first)):
+        return 0
+    # Closed form of the sum without rounding is off by at most half a unit per term, count is found from it and then corrected
+    count = int(log(budget * (ratio - 1) / (base * ratio ** first) + 1) / log(ratio))
+    total = rounded_geometric_sum(base, ratio, first, count)
+    while total + int(round(base * ratio ** (first + count))) <= budget:
+        total += int(round(base * ratio ** (first + count)))
+        count += 1
+    while count > 0 and total > budget:
+        count -= 1
+        total -= int(round(base * ratio ** (first + count)))
+    return count
+
+def arithmetic_count(step: float, first: int, budget: float) -> int:
+    """ Return how many terms of step * (1 + n) for n starting from first can be paid with a budget """
+    if budget < step * (1 + first):
+        return 0
+    # Sum of count terms is step * (count * (1 + first) + count * (count - 1) / 2)
+    count = int((-(first + 0.5) + sqrt((first + 0.5) ** 2 + 2 * budget / step)))
+    while step * ((count + 1) * (1 + first) + (count + 1) * count / 2) <= budget:
+        count += 1
+    while count > 0 and step * (count * (1 + first) + count * (count - 1) / 2) > budget:
+        count -= 1
+    return count
+
+def counter_change(value: float, rate: float, limit: float) -> float:
+    """ Return seconds until format_number() of a value changes while it changes of rate per second
+        up to limit, inf if it never changes, it can be a bit early but never late """
+    if rate == 0 or (rate > 0 and value >= limit):
+        return inf
+    # Under 1000 the integer part is shown, over it 2 decimals of k, M, ... rounded, so it changes at half of last digit
+    step = 1 if value < 1000 else SUFFIX_LIMITS[suffix_position(value) - 1] / 200
+    if rate > 0:
+        return (min((floor(value / step) + 1) * step, limit) - value) / rate
+    return max(0.0, (value - floor(value / step) * step) / -rate)
+
+# ----------> Number formatting <----------------------------------------
+
+SUFFIXES = "", "k", "M", "B", "T"
+SUFFIX_LIMITS = 10 ** 3, 10 ** 6, 10 ** 9, 10 ** 12 # Smallest number shown with each suffix after the first
+
+def suffix_position(num: float) -> int:
+    """ Return position in SUFFIXES of the suffix a number is shown with """
+    position = 0
+    while position < len(SUFFIX_LIMITS) and num >= SUFFIX_LIMITS[position]:
+        position += 1
+    return position
+
+def number_key(num: float, precision: str = "low") -> tuple:
+    """ Return what format_number() shows of a number, integer part and None or value rounded to 2 decimals
+        and suffix position, two numbers with the same key are shown the same """
+    if num < 1000 and (precision == "low" or num == round(num)):
+        return int(floor(num)), None
+    position = suffix_position(num)
+    return round(num / SUFFIX_LIMITS[position - 1] if position > 0 else num, 2), position
+
+def format_key(key: tuple) -> str:
+    """ Return a number shown as its number_key() """
+    value, position = key
+    return str(value) if position == None else f"{value}{SUFFIXES[position]}"
+
+def format_number(num: float, precision: str = "low") -> str:
+    """ Display a number with less decimal and with a literal notation (es 20k),
+        precision 'low' and 'high' determine number of decimal with number < 1000 """
+    return format_key(number_key(num, precision))
+
+def stat(name: str) -> property:
+    """ Return a property for a game stat, changing its value clears derived stats cache """
+    attribute = "_" + name
+    def set_stat(self, value) -> None:
+        if getattr(self, attribute, None) != value:
+            self.derived_stats.clear()
+        setattr(self, attribute, value)
+    return property(attrgetter(attribute), set_stat)
+
+def derived(method):
+    """ Cache value returned by a method until a stat property or the event list changes """
+    name = method.__name__
+    @wraps(method)
+    def cached(self, *args):
+        if self.derived_events_version != self.events.version: # Event list changed
+            self.derived_stats.clear()
+            self.derived_events_version = self.events.version
+        key = (name, *args)
+        if key in self.derived_stats:
+            self.derived_hits += 1
+            return self.derived_stats[key]
+        self.derived_misses += 1
+        value = self.derived_stats[key] = method(self, *args)
+        return value
+    return cached
+
+def journaled(method):
+    """ Append a player action to game journal, only if it changed the game,
+        food and wood before the action are saved for syncing them when replaying """
+    name = method.__name__
+    @wraps(method)
+    def recorded(self, *args, **kwargs):
+        if self.journal == None:
+            return method(self, *args, **kwargs)
+        before = self.signature()
+        value = method(self, *args, **kwargs)
+        if self.signature() != before:
+            self.journal.record(name, list(args), None, before[0], before[1], kwargs)
+        return value
+    return recorded
 
 @unique
 class GameStats(str, Enum):
@@ -27,7 +197,19 @@ class GameStats(str, Enum):
     storage = "storage"
 
 class Game:
+    # Derived stats like costs and production only depends on these stats and on event list
+    population = stat("population")
+    harvester = stat("harvester")
+    lumber = stat("lumber")
+    house = stat("house")
+    granary = stat("granary")
+    storage = stat("storage")
+
     def __init__(self, population: int = 0, food: float = 0, wood: float = 0, harvester: int = 0, lumber: int = 0, house: int = 0, granary: int = 0, storage: int = 0, time: str = "", events_list = "") -> None:
+        self.derived_stats = {} # Cache of derived stats, cleared when a stat changes
+        self.derived_events_version = -1 # Event list version when cache was filled
+        self.derived_hits = 0 # Number of derived stats read from cache
+        self.derived_misses = 0 # Number of derived stats computed
         self.fps = FRAME_PER_SECOND
         self.population = population
         self.time = time
@@ -40,17 +222,17 @@ class Game:
         self.storage = storage
         self.events = events.Events()
         self.max_buildings = 3
-
-        # Offline production
-        if self.time != "":
-            offline_production = min(events.offline_time(self.time), MAX_OFFLINE_TIME) * self.fps * OFFLINE_PRODUCTION_MULTIPLIER
-            self.food += self.harvester_production() * offline_production / self.fps
-            self.wood += self.lumber_production() * offline_production / self.fps
+        self.formatted = {} # Last key and string shown of every counter, see cached_format()
+        self.journal = None # Journal recording player actions and event completions, see journal.py
 
         # Initialize event list
         if events_list != "":
-            self.events.deserialize_events(events)
-            self.init_event()
+            self.events.deserialize_events(events_list)
+
+        # Offline production, events ended while offline are completed at their ending time
+        if self.time != "":
+            offline_time = min(events.offline_time(self.time), MAX_OFFLINE_TIME)
+            self.advance(offline_time, events.get_time(self.time), OFFLINE_PRODUCTION_MULTIPLIER)
 
     # ----------> Save game <----------------------------------------
 
@@ -59,9 +241,8 @@ class Game:
         self.time = events.current_time()
 
     async def save_game(self):
-        """ Save the current game to a .txt file as JSON """
-        with open('savegame.txt', 'w+') as file:
-            file.write(dumps(self.serialize()))
+        """ Save the current game to a .txt file, see savefile.SAVE_FORMAT """
+        write_save(self.serialize())
 
     def serialize(self) -> dict:
         """ Serialize game stats as a dictionary to save it in a JSON file """
@@ -90,23 +271,33 @@ class Game:
             if there is some error load new game """
         try:
             if len(data) != 0:
-                population = data["population"]
-                food = data["resource"]["food"]
-                wood = data["resource"]["wood"]
-                harvester = data["occupation"]["harvester"]
-                lumber = data["occupation"]["lumber"]
-                house = data["building"]["house"]
-                granary = data["building"]["granary"]
-                storage = data["building"]["storage"]
-                time = data["time"]
-                events = data["events"]
-                return cls(population, food, wood, harvester, lumber, house, granary, storage, time, events)
+                return cls.from_dict(data)
         except:
             pass
         return cls()
 
+    @classmethod
+    def from_dict(cls, data: dict):
+        """ Deserialize game stats and return it as a Game class, raise an error if data is not valid """
+        population = data["population"]
+        food = data["resource"]["food"]
+        wood = data["resource"]["wood"]
+        harvester = data["occupation"]["harvester"]
+        lumber = data["occupation"]["lumber"]
+        house = data["building"]["house"]
+        granary = data["building"]["granary"]
+        storage = data["building"]["storage"]
+        time = data["time"]
+        events = data["events"]
+        return cls(population, food, wood, harvester, lumber, house, granary, storage, time, events)
+
+    def signature(self) -> tuple:
+        """ Return a tuple that changes when a player action changes the game """
+        return self.food, self.wood, self.population, self.harvester, self.lumber, self.events.version, self.events.sequence
+
     # ----------> Production <----------------------------------------
 
+    @derived
     def production(self, stat: GameStats) -> float:
         """ Base function for worker production calculation, 
             return production PER SECOND for a resource """
@@ -116,54 +307,84 @@ class Game:
         }
         return stats[stat] ** 1.05 * (1 + (stats[stat] // 10) * 0.5)
 
+    @derived
     def harvester_production(self) -> float:
         """ Return food production PER SECOND from harvester minus population eating food """
         return self.production(GameStats.harvester) - 0.1 * self.population
 
+    @derived
     def lumber_production(self) -> float:
         """ Return wood production PER SECOND from lumber """
         return self.production(GameStats.lumber) * 0.8
 
+    @derived
     def population_cost(self) -> int:
         """ Return cost in food for a unit of population """
         return int(round(50 * 1.1 ** self.population))
 
+    def population_bulk_cost(self, count: int) -> int:
+        """ Return cost in food for a number of people, same as population_cost() for one """
+        return rounded_geometric_sum(50, 1.1, self.population, count)
+
+    def population_buy_limit(self) -> int:
+        """ Return number of people that can be bought with current food and population limit """
+        return min(geometric_count(50, 1.1, self.population, self.food), max(0, self.population_limit() - self.population))
+
+    @derived
     def house_cost(self) -> int:
         """ Return cost in wood for a house """
         return int(round(1000 * 1.2 ** self.house_total()))
 
+    @derived
     def house_total(self) -> int:
         """ Return total house constructed + in construction """
         return self.house + self.events.count("House")
 
+    @derived
     def granary_cost(self) -> int:
         """ Return cost in wood for a granary """
         return int(round(3000 * 1.2 ** self.granary_total()))
 
+    @derived
     def granary_total(self) -> int:
         """ Return total granary constructed + in construction """
         return self.granary + self.events.count("Granary")
 
+    @derived
     def storage_cost(self) -> int:
         """ Return cost in wood for a storage """
         return int(round(8000 * (1 + self.storage_total())))
 
+    @derived
     def storage_total(self) -> int:
         """ Return total storage constructed + in construction """
         return self.storage + self.events.count("Storage")
 
+    def building_buy_limit(self, name: str) -> int:
+        """ Return number of buildings of a kind that can be bought with current wood and free building slots """
+        slots = max(0, self.max_buildings - self.events.count_type("Building"))
+        if name == "House":
+            return min(slots, geometric_count(1000, 1.2, self.house_total(), self.wood))
+        if name == "Granary":
+            return min(slots, geometric_count(3000, 1.2, self.granary_total(), self.wood))
+        return min(slots, arithmetic_count(8000, self.storage_total(), self.wood))
+
+    @derived
     def population_limit(self) -> int:
         """ Return population limit """
         return int(10 * (1 + self.house))
 
+    @derived
     def food_limit(self) -> int:
         """ Return food limit """
         return int(round((1 + self.granary) ** 1.5) * 1000)
 
+    @derived
     def wood_limit(self) -> int:
         """ Return wood limit """
         return int(10000 * (1 + self.storage))
 
+    @journaled
     def food_gathering(self, dry_run: bool = False) -> float:
         """ Add food when the central button is clicked, 
             if dry_run is True return food production,
@@ -173,6 +394,7 @@ class Game:
             self.food += value
         return value
 
+    @journaled
     def wood_gathering(self) -> None:
         """ Add wood after a period of time, clicking again the button shorten that time,
             disable food gathering button, time delta is 2 min + 1 sec * lumberer """
@@ -185,8 +407,12 @@ class Game:
 
     async def autominer(self) -> None:
         """ Add food and wood for worker production, reduce food for people eating in harvester_production() """
-        self.food = round(min(self.food + self.harvester_production() / self.fps, self.food_limit()), 2)
-        self.wood = round(min(self.wood + self.lumber_production() / self.fps, self.wood_limit()), 2)
+        self.mine()
+
+    def mine(self, multiplier: float = 1) -> None:
+        """ Add food and wood for a tick of worker production, multiplier scales production """
+        self.food = round(min(self.food + self.harvester_production() * multiplier / self.fps, self.food_limit()), 2)
+        self.wood = round(min(self.wood + self.lumber_production() * multiplier / self.fps, self.wood_limit()), 2)
         if self.food < -100: # If food < -100 population is reduced
             self.food = 0
             self.population = max(0, self.population - 1)
@@ -206,21 +432,26 @@ class Game:
         """ Return number of people NOT working """
         return int(self.population - self.employed())
 
+    @journaled
     def increment_population(self, num: int = 1) -> None:
-        """ Add a number of people to total population, food will be subtracted """
-        for _ in range(num):
-            if self.food >= self.population_cost() and self.population < self.population_limit():
-                self.food -= self.population_cost()
-                self.population += 1
-
+        """ Add a number of people to total population, food will be subtracted,
+            only people that can be paid are added and their cost is computed at once """
+        count = min(int(num), self.population_buy_limit())
+        if count > 0:
+            self.food -= self.population_bulk_cost(count)
+            self.population += count
+
+    @journaled
     def increment_harvester(self, num: int = 1) -> None:
         """ Add a number of people to harvester """
         self.harvester += min(self.unemployed(), int(num))
 
+    @journaled
     def decrement_harvester(self, num: int = 1) -> None:
         """ Subtract a number of people to harvester """
         self.harvester -= min(self.harvester, int(num))
 
+    @journaled
     def increment_lumber(self, num: int = 1) -> None:
         """ Add a number of people to lumber """
         lumber_plus = min(self.unemployed(), int(num))
@@ -228,6 +459,7 @@ class Game:
         if self.events.exist("WoodPlus"):
             self.events.get("WoodPlus").add_time(seconds = lumber_plus)
 
+    @journaled
     def decrement_lumber(self, num: int = 1) -> None:
         """ Subtract a number of people to lumber """
         lumber_minus = min(self.lumber, int(num))
@@ -235,118 +467,277 @@ class Game:
         if self.events.exist("WoodPlus"):
             self.events.get("WoodPlus").subtract_time(seconds = lumber_minus)
 
-    def increment_house(self, check: bool) -> None:
-        """ Add a house to production, will be added after some times """
-        if check and self.wood >= self.house_cost() and self.events.count_type("Building") < self.max_buildings:
+    @journaled
+    def increment_house(self, check: bool, num: int = 1) -> None:
+        """ Add a number of houses to production, will be added after some times """
+        for _ in range(min(int(num), self.building_buy_limit("House")) if check else 0):
+            if self.wood < self.house_cost():
+                break
             self.wood -= self.house_cost()
             self.events.push(events.Event("House", "Building", minutes = self.house_total() + 1))
 
-    def increment_granary(self, check: bool) -> None:
-        """ Add a granary to production, will be added after some times """
-        if check and self.wood >= self.granary_cost() and self.events.count_type("Building") < self.max_buildings:
+    @journaled
+    def increment_granary(self, check: bool, num: int = 1) -> None:
+        """ Add a number of granaries to production, will be added after some times """
+        for _ in range(min(int(num), self.building_buy_limit("Granary")) if check else 0):
+            if self.wood < self.granary_cost():
+                break
             self.wood -= self.granary_cost()
             self.events.push(events.Event("Granary", "Building", minutes = (self.granary_total() * 1.5) + 1))
 
-    def increment_storage(self, check: bool) -> None:
-        """ Add a storage to production, will be added after some times """
-        if check and self.wood >= self.storage_cost() and self.events.count_type("Building") < self.max_buildings:
+    @journaled
+    def increment_storage(self, check: bool, num: int = 1) -> None:
+        """ Add a number of storages to production, will be added after some times """
+        for _ in range(min(int(num), self.building_buy_limit("Storage")) if check else 0):
+            if self.wood < self.storage_cost():
+                break
             self.wood -= self.storage_cost()
             self.events.push(events.Event("Storage", "Building", minutes = (self.storage_total() + 1) * 5))
 
     # ----------> Formatting <----------------------------------------
 
+    def next_counter_change(self) -> float:
+        """ Return seconds until food or wood counter shown changes with current production, inf if they don't change """
+        return min(counter_change(self.food, self.harvester_production(), self.food_limit()),
+                   counter_change(self.wood, self.lumber_production(), self.wood_limit()))
+
+    def cached_format(self, counter: str, template: str, *values, precision: str = "low") -> str:
+        """ Return the string of a counter, values are numbers or strings put in template,
+            string is built again only when what is shown of values changes, else it's the same object """
+        cached = self.formatted.get(counter)
+        if cached != None and cached[0] == values:
+            return cached[2]
+        keys = tuple(value if isinstance(value, str) else number_key(value, precision) for value in values)
+        if cached != None and cached[1] == keys:
+            text = cached[2]
+        else:
+            text = template.format(*(key if isinstance(key, str) else format_key(key) for key in keys))
+        self.formatted[counter] = (values, keys, text)
+        return text
+
     def format_food(self) -> str:
         """ Return food as a formatted string for displaying """
-        return f"{self.format_number(min(self.food, self.food_limit()))}/{self.format_number(self.food_limit())}"
+        return self.cached_format("food", "{}/{}", min(self.food, self.food_limit()), self.food_limit())
 
     def format_wood(self) -> str:
         """ Return wood as a formatted string for displaying """
-        return f"{self.format_number(min(self.wood, self.wood_limit()))}/{self.format_number(self.wood_limit())}"
+        return self.cached_format("wood", "{}/{}", min(self.wood, self.wood_limit()), self.wood_limit())
 
     def format_population(self) -> str:
         """ Return population/max_populaation as a formatted string for displaying """
-        return f"{self.format_number(self.population)}/{self.format_population_limit()}"
+        return self.cached_format("population", "{}/{}", self.population, self.population_limit())
 
     def format_food_gathering(self) -> str:
         """ Return food produced form food gathering as a formatted string for displaying """
-        return self.format_number(self.food_gathering(dry_run=True), "high")
+        return self.cached_format("food_gathering", "{}", self.food_gathering(dry_run=True), precision = "high")
         
     def format_harvester(self) -> str:
         """ Return harvester as a formatted string for displaying """
-        return self.format_number(self.harvester)
+        return self.cached_format("harvester", "{}", self.harvester)
 
     def format_lumber(self) -> str:
         """ Return lumber as a formatted string for displaying """
-        return self.format_number(self.lumber)
+        return self.cached_format("lumber", "{}", self.lumber)
 
     def format_harvester_production(self) -> str:
         """ Return food production as a formatted string for displaying """
-        return self.format_number(self.harvester_production(), "high") + "/s"
+        return self.cached_format("harvester_production", "{}/s", self.harvester_production(), precision = "high")
 
     def format_lumber_production(self) -> str:
         """ Return wood production as a formatted string for displaying """
-        return self.format_number(self.lumber_production(), "high") + "/s"
+        return self.cached_format("lumber_production", "{}/s", self.lumber_production(), precision = "high")
 
     def format_population_cost(self) -> str:
         """ Return population cost as a formatted string for displaying """
-        return self.format_number(self.population_cost())
+        return self.cached_format("population_cost", "{}", self.population_cost())
 
     def format_population_limit(self) -> str:
         """ Return population limit as a formatted string for displaying """
-        return self.format_number(self.population_limit())
+        return self.cached_format("population_limit", "{}", self.population_limit())
     
     def format_house_cost(self) -> str:
         """ Return house cost as a formatted string for displaying """
-        return f"{events.format_time_delta_str(minutes = (self.house_total() + 1))} - {self.format_number(self.house_cost())}"
+        return self.cached_format("house_cost", "{} - {}", events.format_time_delta_str(minutes = (self.house_total() + 1)), self.house_cost())
 
     def format_granary_cost(self) -> str:
         """ Return granary cost as a formatted string for displaying """
-        return f"{events.format_time_delta_str(minutes = (self.granary_total() * 1.5) + 2)} - {self.format_number(self.granary_cost())}"
+        return self.cached_format("granary_cost", "{} - {}", events.format_time_delta_str(minutes = (self.granary_total() * 1.5) + 2), self.granary_cost())
 
     def format_storage_cost(self) -> str:
         """ Return storage cost as a formatted string for displaying """
-        return f"{events.format_time_delta_str(minutes = (self.storage_total() + 1) * 5)} - {self.format_number(self.storage_cost())}"
+        return self.cached_format("storage_cost", "{} - {}", events.format_time_delta_str(minutes = (self.storage_total() + 1) * 5), self.storage_cost())
         
     def format_number(self, num: float, precision: str = "low") -> str:
         """ Display a number with less decimal and with a literal notation (es 20k),
             precision 'low' and 'high' determine number of decimal with number < 1000 """
-        if num < 1000 and (precision == "low" or num == round(num)):
-            return str(int(floor(num)))
-        suffix = "", "k", "M", "B", "T"
-        position = floor(log10(max(num, 1))) // 3
-        return f"{round(num / (10 ** (position * 3)), 2)}{suffix[position]}"
+        return format_number(num, precision)
 
     # ----------> Events <----------------------------------------
 
-    async def manage_event(self) -> None:
-        """ Manage event list every tick, for adding value to counter or checking if an event is expired """
-        if len(self.events.expired()) > 0:
-            for event in self.events.expired():
-                if event.name == "WoodPlus":
-                    self.wood += event.counter
-                    self.events.push(events.Event("WoodPlusDebuff", "Debuff", seconds = 3)) # Can't reactivate gathering wood for 3 sec
-                elif event.name == "House":
-                    self.house += 1
-                elif event.name == "Granary":
-                    self.granary += 1
-                elif event.name == "Storage":
-                    self.storage += 1
-            self.events.remove_expired()
+    async def manage_event(self, time: datetime = None) -> None:
+        """ Manage event list every tick, for adding value to counter or checking if an event is expired,
+            time is the time of the tick (default is current time) """
+        self.update_events(time)
 
+    def update_events(self, time: datetime = None) -> None:
+        """ Complete events expired at a time (default is current time) and add a tick to wood gathering counter """
+        self.complete_expired(time)
         if self.events.exist("WoodPlus"):
             self.event_wood_plus_production(tick = 1)
 
-    def init_event(self) -> None:
-        """ Init event at the start of the game, add value to counter for time passed """
-        if self.events.exist("WoodPlus"):
-            end_time = events.now()
-            if self.events.get("WoodPlus").is_passed():
-                end_time = self.events.get("WoodPlus").ending_time()
-            time_elapsed = end_time - events.get_time(self.time)
-            self.event_wood_plus_production(seconds = time_elapsed.seconds)
+    def complete_expired(self, time: datetime = None) -> None:
+        """ Complete events expired at a time (default is current time) """
+        expired = self.events.expired(time)
+        if len(expired) > 0:
+            for event in expired:
+                self.complete_event(event, time)
+            self.events.remove_expired(time)
+
+    def complete_event(self, event: events.Event, time: datetime = None) -> None:
+        """ Give the reward of an expired event, time is when the event is completed (default is current time) """
+        if event.name == "WoodPlus":
+            debuff = events.Event("WoodPlusDebuff", "Debuff", seconds = 3) # Can't reactivate gathering wood for 3 sec
+            if time != None:
+                debuff.set_starting_time(time)
+            self.wood += event.counter
+            self.events.push(debuff)
+        elif event.name == "House":
+            self.house += 1
+        elif event.name == "Granary":
+            self.granary += 1
+        elif event.name == "Storage":
+            self.storage += 1
+        if self.journal != None: # Food and wood are saved for syncing them when replaying
+            self.journal.record("complete_event", [event.name], time, self.food, self.wood)
 
     def event_wood_plus_production(self, seconds: int = 0, tick: int = 0) -> None:
         """ Add value to counter of the wood gathering event, depends to the number of lumber """
         if self.events.exist("WoodPlus"):
             total_time = seconds * self.fps + tick
-            self.events.get("WoodPlus").counter += total_time * (0.2 + self.lumber_production() * 0.5 / self.fps)
\ No newline at end of file
+            self.events.get("WoodPlus").counter += total_time * (0.2 + self.lumber_production() * 0.5 / self.fps)
+
+    # ----------> Fast forward <----------------------------------------
+
+    def advance(self, seconds: float, start: datetime = None, multiplier: float = 1) -> None:
+        """ Move the game forward of some seconds starting from a time (default is current time),
+            result is the same of calling autominer() and manage_event() every tick, but production
+            between two event endings is computed in closed form so cost depends on number of events,
+            multiplier scales worker production (used for offline production) """
+        start = events.now() if start == None else start
+        ticks = int(round(seconds * self.fps))
+        done = 0
+        while done < ticks:
+            deadline = self.events.next_deadline()
+            until = ticks # Next tick with an event ending
+            if deadline != None:
+                until = min(ticks, max(done + 1, ceil((deadline - start).total_seconds() * self.fps)))
+            self.produce(until - done - 1, multiplier)
+            self.mine(multiplier)
+            self.update_events(start + timedelta(seconds = until / self.fps))
+            done = until
+
+    def produce(self, ticks: int, multiplier: float = 1) -> None:
+        """ Same as calling mine() and adding a tick to wood gathering counter for a number of ticks
+            when no event ends, mine() is called only for the first tick and for ticks when population starves """
+        while ticks > 0:
+            self.mine(multiplier) # After a tick food and wood are multiple of 0.01
+            self.event_wood_plus_production(tick = 1)
+            ticks -= 1
+            self.food, steps = repeat_tick(self.food, self.harvester_production() * multiplier / self.fps, self.food_limit(), ticks, -100)
+            self.wood, steps = repeat_tick(self.wood, self.lumber_production() * multiplier / self.fps, self.wood_limit(), steps)
+            self.event_wood_plus_production(tick = steps)
+            ticks -= steps
+
+class Stepper:
+    def __init__(self, game: Game) -> None:
+        self.game = game
+        self.accumulator = 0.0 # Real seconds elapsed not yet simulated, less than a tick
+
+    def update(self, elapsed: float, time: datetime = None) -> int:
+        """ Run engine ticks for real seconds elapsed until a time (default is current time),
+            game speed is the same at any frame rate, return number of ticks done """
+        time = events.now() if time == None else time
+        self.accumulator += max(0.0, elapsed)
+        ticks = int(self.accumulator * self.game.fps)
+        self.accumulator -= ticks / self.game.fps
+        start = time - timedelta(seconds = ticks / self.game.fps) # Time of last tick done
+        if ticks > MAX_CATCH_UP_TICKS:
+            self.game.advance(ticks / self.game.fps, start)
+            return ticks
+        for tick in range(1, ticks + 1):
+            self.game.mine()
+            self.game.update_events(start + timedelta(seconds = tick / self.game.fps))
+        return ticks
+
+# ----------> Lazy game <----------------------------------------
+# A game that is never ticked: reading or writing a stat first moves it forward to current time with Game.advance(),
+# so its cost depends on how often it's used and on its events, not on time passed. Used by server.py
+
+def lazy_stat(name: str) -> property:
+    """ Return a property for a stat of LazyGame, game is moved forward to current time before reading or writing it """
+    base = getattr(Game, name, None) # Stats with a derived stats cache, food and wood are plain attributes
+    attribute = "_" + name
+    get_value = attrgetter(attribute) if base == None else base.fget
+    set_value = (lambda self, value: setattr(self, attribute, value)) if base == None else base.fset
+    def get_stat(self):
+        if not self.settling:
+            self.settle()
+        return get_value(self)
+    def set_stat(self, value) -> None:
+        if not self.settling:
+            self.settle()
+        set_value(self, value)
+    return property(get_stat, set_stat)
+
+def settled(method):
+    """ Move a LazyGame forward to current time before a player action, it may depend on events ended meanwhile """
+    @wraps(method)
+    def action(self, *args, **kwargs):
+        self.settle()
+        return method(self, *args, **kwargs)
+    return action
+
+class LazyGame(Game):
+    food = lazy_stat("food")
+    wood = lazy_stat("wood")
+    population = lazy_stat("population")
+    harvester = lazy_stat("harvester")
+    lumber = lazy_stat("lumber")
+    house = lazy_stat("house")
+    granary = lazy_stat("granary")
+    storage = lazy_stat("storage")
+    # Player actions
+    food_gathering = settled(Game.food_gathering)
+    wood_gathering = settled(Game.wood_gathering)
+    increment_population = settled(Game.increment_population)
+    increment_harvester = settled(Game.increment_harvester)
+    decrement_harvester = settled(Game.decrement_harvester)
+    increment_lumber = settled(Game.increment_lumber)
+    decrement_lumber = settled(Game.decrement_lumber)
+    increment_house = settled(Game.increment_house)
+    increment_granary = settled(Game.increment_granary)
+    increment_storage = settled(Game.increment_storage)
+
+    def __init__(self, *args, **kwargs) -> None:
+        self.settling = True # True while the game is moved forward, stats are used as they are
+        super().__init__(*args, **kwargs)
+        self.settled_time = events.now() # Time production is computed until
+        self.settling = False
+
+    def settle(self, time: datetime = None) -> None:
+        """ Move the game forward to a time (default is current time) as Stepper does,
+            only whole ticks are done, the rest is done next time """
+        time = events.now() if time == None else time
+        ticks = int((time - self.settled_time).total_seconds() * self.fps)
+        if ticks <= 0 or self.settling:
+            return
+        self.settling = True
+        try:
+            self.advance(ticks / self.fps, self.settled_time)
+            self.settled_time += timedelta(seconds = ticks / self.fps)
+        finally:
+            self.settling = False
+
+    def next_deadline(self) -> datetime:
+        """ Return when next event ends, the game must be settled then to complete it, None if there is no event """
+        return self.events.next_deadline()
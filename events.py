@@ -1,12 +1,55 @@
 from datetime import timedelta, datetime
+from functools import lru_cache
+from heapq import heapify, heappop, heappush
+from time import monotonic
 
 # ----------> Time functions <----------------------------------------
 
 TIME_FORMATTING = "%Y-%m-%dT%H:%M:%S"
+ONE_SECOND = timedelta(seconds = 1)
+NO_TIME = timedelta(seconds = 0)
+
+class Clock:
+    def __init__(self) -> None:
+        self.wall = datetime.today() # Wall time read once when session starts
+        self.start = monotonic() # Monotonic time when session starts
+        self.time = self.wall # Time of current tick
+
+    def tick(self) -> datetime:
+        """ Read time once for a tick, session time moves with time.monotonic() so it never goes back """
+        self.time = self.wall + timedelta(seconds = monotonic() - self.start)
+        return self.time
+
+    def now(self) -> datetime:
+        """ Return time of current tick """
+        return self.time
+
+class VirtualClock:
+    def __init__(self, time: datetime = None) -> None:
+        self.time = datetime.today() if time == None else time # Current time, moved only by advance()
+
+    def tick(self) -> datetime:
+        """ Return current virtual time, it doesn't move with real time """
+        return self.time
+
+    def now(self) -> datetime:
+        """ Return current virtual time """
+        return self.time
+
+    def advance(self, seconds: float) -> None:
+        """ Move time forward of some seconds """
+        self.time += timedelta(seconds = seconds)
+
+CLOCK = Clock() # Clock used by all events, ticked once per frame, replaced with a VirtualClock for simulations
+
+def set_clock(clock) -> None:
+    """ Replace the clock used by all events """
+    global CLOCK
+    CLOCK = clock
 
 def now() -> datetime:
-    """ Return a datetime with current date and time """
-    return datetime.today()
+    """ Return a datetime with date and time of current tick """
+    return CLOCK.now()
 
 def current_time() -> str:
     """ Return a formatted string with current date and time """
@@ -34,13 +77,14 @@ def format_time_delta(time_obj: timedelta) -> str:
         f"{seconds}s" if time_obj.seconds > 1 else ""]
     )
 
+@lru_cache(maxsize = 256)
 def format_time_delta_str(days: int = 0, hours: int = 0, minutes: int = 0, seconds: int = 0) -> str:
-    """ Return a formatted string from a time delta as days, hours, minutes, seconds """
+    """ Return a formatted string from a time delta as days, hours, minutes, seconds, results are cached """
     return format_time_delta(timedelta(days = days, hours = hours, minutes = minutes, seconds = seconds))
 
 def offline_time(time: str) -> int:
     """ Return the number of seconds from last online time """
-    return int((get_time(current_time()) - (get_time(time))).seconds)
+    return max(0, int((get_time(current_time()) - (get_time(time))).total_seconds()))
 
 # ----------> Event class <----------------------------------------
 
@@ -49,9 +93,33 @@ class Event:
         self.name = name # Event name
         self.type = type # Event type (eg. Resources or Building)
         self.counter = counter # Not time related, eventually contains a number who give reward at the event end
+        self.owner: Events = None # Events containing this event, told when ending time changes
+        self.sequence = 0 # Sequence of last heap entry of this event in owner
         self.starting_time = now() # Don't change once is initialized except when loading game
         self.timedelta = timedelta(days = days, hours = hours, minutes = minutes, seconds = seconds) # Event duration
 
+    @property
+    def starting_time(self) -> datetime:
+        return self._starting_time
+
+    @starting_time.setter
+    def starting_time(self, starting_time: datetime) -> None:
+        self._starting_time = starting_time
+        self._ending_time = None # Computed again when needed
+        if self.owner != None:
+            self.owner.schedule(self)
+
+    @property
+    def timedelta(self) -> timedelta:
+        return self._timedelta
+
+    @timedelta.setter
+    def timedelta(self, duration: timedelta) -> None:
+        self._timedelta = duration
+        self._ending_time = None # Computed again when needed
+        if self.owner != None:
+            self.owner.schedule(self)
+
     def set_starting_time(self, starting_time: str or datetime) -> None:
         """ Take a string o a datetime object and set it as current starting time """
         if isinstance(starting_time, str):
@@ -63,23 +131,36 @@ class Event:
         """ Set a new time delta to event """
         self.timedelta = timedelta(seconds = timedelta_seconds)
 
-    def ending_time(self) -> datetime:
-        """ Return ending time of event """
-        return (self.starting_time if self.starting_time != None else now()) + self.timedelta
+    def ending_time(self, time: datetime = None) -> datetime:
+        """ Return ending time of event, if event is not started it starts at a time (default is current time) """
+        if self.starting_time == None:
+            return (now() if time == None else time) + self.timedelta
+        if self._ending_time == None:
+            self._ending_time = self.starting_time + self.timedelta
+            self._deadline = self._ending_time - ONE_SECOND
+        return self._ending_time
+
+    def deadline(self) -> datetime:
+        """ Return the time when event is considered passed, None if event is not started """
+        if self.starting_time == None:
+            return None
+        self.ending_time()
+        return self._deadline
 
-    def is_passed(self) -> bool:
-        """ Return True if ending time of event is passed """
-        return self.starting_time != None and now() >= self.ending_time() - timedelta(seconds = 1)
+    def is_passed(self, time: datetime = None) -> bool:
+        """ Return True if ending time of event is passed at a time, default is current time """
+        return self.starting_time != None and (now() if time == None else time) >= self.deadline()
 
-    def lasting_time(self) -> timedelta:
-        """ Return remaining time to end of event """
-        return self.ending_time() - now()
+    def lasting_time(self, time: datetime = None) -> timedelta:
+        """ Return remaining time to end of event at a time, default is current time """
+        time = now() if time == None else time
+        return self.ending_time(time) - time
 
-    def format_lasting_time(self) -> str:
+    def format_lasting_time(self, time: datetime = None) -> str:
         """ Return remaining time to end formatted for displaying """
         if self.starting_time == None:
             return format_time_delta(self.timedelta)
-        return format_time_delta(max(self.lasting_time(), timedelta(seconds=0)))
+        return format_time_delta(max(self.lasting_time(time), NO_TIME))
 
     def add_time(self, days: int = 0, hours: int = 0, minutes: int = 0, seconds: int = 0) -> None:
         """ Add time to remaining time of event """
@@ -98,14 +179,26 @@ class Event:
         return {
             "name": self.name,
             "type": self.type,
-            "counter": str(self.counter),
+            "counter": self.counter,
             "starting_time": set_time(self.starting_time),
-            "timedelta": str(self.timedelta.seconds)
+            "timedelta": self.timedelta.seconds
         }
 
 class Events:
-    def __init__(self, events: list = []) -> None:
-        self.events = events
+    def __init__(self, events: list = None) -> None:
+        self.queue = {} # All events in insertion order, as keys of a dict for O(1) removal
+        self.names = {} # Events by name, each one a dict in insertion order
+        self.types = {} # Events by type, each one a dict in insertion order
+        self.heap = [] # Min-heap of (deadline, sequence, event), old entries are skipped when found
+        self.sequence = 0 # Increased for every heap entry, an entry is valid if event has the same sequence
+        self.version = 0 # Increased every time an event is added or removed
+        for event in events or []:
+            self._add_event(event)
+
+    @property
+    def events(self) -> list:
+        """ Return a list of all events in insertion order """
+        return list(self.queue)
 
     def deserialize_events(self, event_dict_list: list) -> None:
         """ Load a list of event from a list of dictionary """
@@ -120,39 +213,79 @@ class Events:
     
     def serialize_events(self) -> None:
         """ Serialize event list as a list of dictionary """
-        return [event.serialize_event() for event in self.events]
+        return [event.serialize_event() for event in self.queue]
 
     def push(self, event: Event) -> None:
         """ Insert an event in list """
         if event.type == "Building":
             event.counter = self.count_type("Building")
             if event.counter > 0: # Postpone building if there is another one in construction
-                event.starting_time = self.buildings()[event.counter - 1].ending_time()
-        self.events.append(event)
+                event.starting_time = next(reversed(self.types["Building"])).ending_time()
+        self._add_event(event)
+
+    def _add_event(self, event: Event) -> None:
+        """ Add an event to list and indexes """
+        self.version += 1
+        self.queue[event] = None
+        self.names.setdefault(event.name, {})[event] = None
+        self.types.setdefault(event.type, {})[event] = None
+        event.owner = self
+        self.schedule(event)
+
+    def schedule(self, event: Event) -> None:
+        """ Add event to heap with its current deadline, called again when ending time changes """
+        self.sequence += 1
+        event.sequence = self.sequence
+        if event.starting_time != None:
+            heappush(self.heap, (event.deadline(), self.sequence, event))
+        if len(self.heap) > 2 * len(self.queue) + 16: # Too many old entries, rebuild heap
+            self.heap = [entry for entry in self.heap if self._is_valid(entry)]
+            heapify(self.heap)
+
+    def _is_valid(self, entry: tuple) -> bool:
+        """ Return True if heap entry is the last one of an event still in list """
+        return entry[2].owner is self and entry[2].sequence == entry[1]
 
     def _remove_event(self, event: Event) -> None:
         """ Given an event remove that from list """
-        self.events.remove(event)
+        self.version += 1
+        del self.queue[event]
+        del self.names[event.name][event]
+        del self.types[event.type][event]
+        event.owner = None # Its heap entry is no more valid
         if event.type == "Building": # Reduce all counter for all building by one
-            for evt in self.events:
-                if evt.type == "Building":
-                    evt.counter -= 1
+            for evt in self.types["Building"]:
+                evt.counter -= 1
 
     def remove(self, event_name: str) -> None:
         """ Given a name remove the first event with that name from list """
-        for event in self.events:
-            if event.name == event_name:
-                self._remove_event(event)
+        event = self.get(event_name)
+        if event != None:
+            self._remove_event(event)
     
-    def expired(self) -> list:
-        """ Return a list of event with ending time more or equal of current time """
-        return [event for event in self.events if event.is_passed()]
-
-    def remove_expired(self) -> None:
+    def expired(self, time: datetime = None) -> list:
+        """ Return a list of event with ending time more or equal of a time, default is current time """
+        time = now() if time == None else time
+        entries = []
+        while len(self.heap) > 0 and self.heap[0][0] <= time:
+            entry = heappop(self.heap)
+            if self._is_valid(entry):
+                entries.append(entry)
+        for entry in entries: # Expired events stay in heap until removed
+            heappush(self.heap, entry)
+        return [entry[2] for entry in entries]
+
+    def remove_expired(self, time: datetime = None) -> None:
         """ Remove all expired event from list """
-        for event in self.expired():
+        for event in self.expired(time):
             self._remove_event(event)
 
+    def next_deadline(self) -> datetime:
+        """ Return the first time when an event will be passed, None if there is no started event """
+        while len(self.heap) > 0 and not self._is_valid(self.heap[0]):
+            heappop(self.heap)
+        return self.heap[0][0] if len(self.heap) > 0 else None
+
     def exist(self, event_name: str) -> bool:
         """ Given a name return True if exist an event with that name """
         return self.count(event_name) > 0
@@ -163,18 +296,16 @@ class Events:
 
     def count_type(self, event_type: str) -> int:
         """ Given a type return the number of event with that type """
-        return len([1 for event in self.events if event.type == event_type])
+        return len(self.types.get(event_type, ()))
 
     def count(self, event_name: str) -> int:
         """ Given a name return the number of event with that name """
-        return len([1 for event in self.events if event.name == event_name])
+        return len(self.names.get(event_name, ()))
 
     def get(self, event_name: str) -> Event:
         """ Given a name return first event with that name """
-        return next((event for event in self.events if event.name == event_name), None)
+        return next(iter(self.names.get(event_name, ())), None)
 
     def buildings(self) -> list:
-        """ Return a list of all building events in order """
-        buildings = [event for event in self.events if event.type == "Building"]
-        buildings.sort(key=lambda event: event.counter) # Sort the building based on counter value
-        return buildings
\ No newline at end of file
+        """ Return a list of all building events in order, buildings are inserted in counter order """
+        return list(self.types.get("Building", ()))
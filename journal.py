@@ -0,0 +1,133 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from json import dumps, loads
+from threading import Lock
+from time import monotonic
+from autosave import Autosave
+from engine import MAX_OFFLINE_TIME, OFFLINE_PRODUCTION_MULTIPLIER, Game
+from savefile import SAVE_FILE, read_saves, write_file, write_save
+import events
+
+# Journal mode: player actions and event completions are appended to a log as one JSON line each,
+# a full save (snapshot) is written only every SNAPSHOT_INTERVAL and then the log starts again.
+# First line of the log tells which snapshot it belongs to, loading replays the log on top of that snapshot.
+# A record is [time, name, args, food, wood] and actions add their keyword arguments, food and wood are the values
+# before an action or after a completion: production replayed between records may differ by a tick, they are synced
+
+JOURNAL_FILE = "savegame.journal"
+SNAPSHOT_INTERVAL = 30 # In seconds, minimum time between two snapshots
+COMPLETION = "complete_event" # Record of an event completion, it has food and wood after the completion
+
+class Journal(Autosave):
+    def __init__(self, interval: float = SNAPSHOT_INTERVAL, path: str = SAVE_FILE, journal_path: str = JOURNAL_FILE) -> None:
+        super().__init__(interval, path)
+        self.journal_path = journal_path # Log file path
+        self.lock = Lock() # Log is replaced on the worker thread while records are appended
+        self.file = None # Log opened for appending
+        self.carry: list = None # Records appended while a snapshot is written, copied in the new log
+
+    def attach(self, game: Game) -> None:
+        """ Write a snapshot of a game and record its actions from now on """
+        self.compact(self.snapshot(game), events.now().isoformat())
+        game.journal = self
+
+    def record(self, name: str, args: list, time: datetime = None, *sync) -> None:
+        """ Append an action done at a time (default is current time) to the log, sync are values restored when replaying it """
+        line = dumps([(events.now() if time == None else time).isoformat(), name, args, *sync]) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            if self.carry != None:
+                self.carry.append(line)
+
+    def compact(self, data: dict, started: str) -> None:
+        """ Write a snapshot taken at a time, then start a new log with records appended meanwhile """
+        write_save(data, self.path)
+        with self.lock:
+            header = dumps({"snapshot": data["time"], "time": started}) + "\n"
+            write_file((header + "".join(self.carry or [])).encode(), self.journal_path, 0)
+            if self.file != None:
+                self.file.close()
+            self.file = open(self.journal_path, 'a')
+            self.carry = None
+
+    async def tick(self, game: Game) -> None:
+        """ Called every frame, write a snapshot if interval is passed and game is changed,
+            snapshot is written on the worker thread, the log keeps growing meanwhile """
+        if monotonic() - self.last_save < self.interval:
+            return
+        if self.pending is not None and not self.pending.done():
+            return
+        self.check_save()
+        self.last_save = monotonic()
+        data = self.snapshot(game)
+        if self.is_dirty(data):
+            with self.lock:
+                self.carry = []
+            self.pending = self.executor.submit(self.compact, data, events.now().isoformat())
+            self.saves += 1
+
+    def flush(self, game: Game) -> None:
+        """ Wait for pending snapshot and write current game, used when closing the game """
+        self.executor.shutdown(wait = True)
+        self.check_save()
+        self.compact(self.snapshot(game), events.now().isoformat())
+        self.saves += 1
+        self.executor = ThreadPoolExecutor(max_workers = 1)
+
+# ----------> Recovery <----------------------------------------
+
+def read_journal(journal_path: str = JOURNAL_FILE) -> tuple:
+    """ Return log header and records, a record broken by a crash and records after it are dropped """
+    try:
+        with open(journal_path, 'r') as file:
+            lines = file.read().split("\n")
+        header = loads(lines[0])
+    except (OSError, ValueError):
+        return None, []
+    records = []
+    for line in lines[1:]:
+        try:
+            records.append(loads(line))
+        except ValueError: # Last line is empty or written while crashing
+            break
+    return header, records
+
+def replay(game: Game, records: list, start: datetime) -> datetime:
+    """ Apply records to a game loaded from a snapshot taken at start, production between
+        two records is computed by Game.advance(), return time of last record """
+    clock, time = events.CLOCK, start
+    try:
+        for record in records:
+            record_time = datetime.fromisoformat(record[0])
+            events.set_clock(events.VirtualClock(record_time)) # Actions see the time they were done
+            game.advance(max(0.0, (record_time - time).total_seconds()), time)
+            time = record_time
+            name, args = record[1], record[2]
+            if name == COMPLETION:
+                game.complete_expired(time)
+                game.food, game.wood = record[3], record[4]
+            else:
+                if len(record) > 3: # Logs written before actions were synced have only time, name and args
+                    game.food, game.wood = record[3], record[4]
+                getattr(game, name)(*args, **(record[5] if len(record) > 5 else {}))
+    finally:
+        events.set_clock(clock)
+    return time
+
+def recover(save_path: str = SAVE_FILE, journal_path: str = JOURNAL_FILE) -> Game:
+    """ Load newest valid save, if the log belongs to it replay the log and then add offline production
+        from last record, otherwise load the save as load_game() does """
+    header, records = read_journal(journal_path)
+    for data in read_saves(save_path):
+        try:
+            if header == None or header.get("snapshot") != data["time"]:
+                return Game.from_dict(data)
+            game = Game.from_dict({**data, "time": ""}) # No offline production until log is replayed
+            last = replay(game, records, datetime.fromisoformat(header["time"]))
+            offline_time = min(max(0.0, (events.now() - last).total_seconds()), MAX_OFFLINE_TIME)
+            game.advance(offline_time, last, OFFLINE_PRODUCTION_MULTIPLIER)
+            return game
+        except (KeyError, TypeError, ValueError, IndexError, AttributeError):
+            continue
+    return Game()
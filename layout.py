@@ -0,0 +1,153 @@
+from functools import lru_cache
+import assets
+
+# Position and size of every image of the window, a table for each menu computed once for a screen size,
+# Ui creates an image for every entry with the entry name as attribute name.
+# Tables are written for a BASE_WIDTH x BASE_HEIGHT screen, other sizes scale every entry and text size
+
+# Lambdas who calculate button heigth given width
+large_h = lambda large_w: int(round(large_w * 0.364, 0))
+medium_h = lambda large_w: int(round(large_w * 0.434, 0))
+tag_h = lambda large_w: int(round(large_w * 0.615, 0))
+square_h = lambda square_w: int(round(square_w * 1.09, 0))
+round_h = lambda round_w: int(round(round_w * 1.03, 0))
+arrow_h = lambda round_w: int(round(round_w * 1.25, 0))
+
+# Base button width and position
+RESOURCE = 230
+PRODUCTION = RESOURCE * 0.55
+FOOD = 200
+MENU = 275
+ARROW = 80
+WORKER_X, WORKER_Y = 70, 280
+
+BASE_WIDTH = 1024
+BASE_HEIGHT = BASE_WIDTH * 3 // 4 # Display aspect ratio 4:3
+MIN_WIDTH = 512 # Smaller windows show only part of the screen
+
+FIRST_FRAME = ("main", "explore") # Tables shown in first frame, pictures of others are loaded after it
+HIT_CELL = 64 # Side in pixels of a cell of HitGrid
+
+def widget(picture: str, x: float, y: float, w: float, h: float, **options) -> tuple:
+    """ Return a layout entry, options are the other arguments of assets.Image """
+    return picture, x, y, w, h, options
+
+def fit_size(width: int, height: int) -> tuple:
+    """ Return the biggest 4:3 screen size that fits a window, screen is drawn on window top left corner """
+    W = max(MIN_WIDTH, min(width, height * 4 // 3))
+    return W, W * 3 // 4
+
+def scale_widget(entry: tuple, scale: float) -> tuple:
+    """ Return a layout entry with position, size and text size multiplied by scale """
+    picture, x, y, w, h, options = entry
+    return picture, x * scale, y * scale, w * scale, h * scale, {**options, "text_size": round(options.get("text_size", assets.TEXT_SIZE) * scale)}
+
+@lru_cache(maxsize = 4)
+def layout(W: int, H: int) -> dict:
+    """ Return layout tables for a screen size, each one is a dictionary of entries by image name,
+        don't change them, they are shared """
+    scale = min(W / BASE_WIDTH, H / BASE_HEIGHT)
+    return {table: {name: scale_widget(entry, scale) for name, entry in widgets.items()}
+            for table, widgets in base_layout(BASE_WIDTH, BASE_HEIGHT).items()}
+
+def pictures(W: int, H: int) -> list:
+    """ Return (path, size) of every picture images can show at a screen size, to load them before using them """
+    tables = layout(W, H)
+    entries = {name: entry for widgets in tables.values() for name, entry in widgets.items()}
+    result = [(picture, (w, h)) for picture, x, y, w, h, options in entries.values()]
+    for name, paths in ALTERNATES.items():
+        picture, x, y, w, h, options = entries[name]
+        result += [(path, (w, h)) for path in paths]
+    return result
+
+def base_layout(W: int, H: int) -> dict:
+    """ Return layout tables for a screen size without scaling sizes written in pixels """
+    return {
+        "main": { # Shown in every menu
+            "background": widget(assets.BACKGROUND_EXPLORE, 0, 0, W, H),
+            "manage_menu": widget(assets.LARGE, (W - 3 * MENU) // 4, H - large_h(MENU) - 20, MENU, large_h(MENU), text = "Manage", text_size = 30),
+            "explore_menu": widget(assets.LARGE, (W - 3 * MENU) * 2 // 4 + MENU, H - large_h(MENU) - 20, MENU, large_h(MENU), text = "Explore", text_size = 30),
+            "city_menu": widget(assets.LARGE, (W - 3 * MENU) * 3 // 4 + 2 * MENU, H - large_h(MENU) - 20, MENU, large_h(MENU), text = "City", text_size = 30),
+            # Tag with current resources
+            "food_tag": widget(assets.LARGE_FOOD, 0.03 * W, 0.03 * H, RESOURCE, large_h(RESOURCE), text = 0, text_x = 0.4, text_size = 23),
+            "wood_tag": widget(assets.LARGE_WOOD, 0.06 * W + RESOURCE, 0.03 * H, RESOURCE, large_h(RESOURCE), text = 0, text_x = 0.4, text_size = 23),
+            "food_prod_tag": widget(assets.SHORT_TAG, 0.03 * W + RESOURCE * 0.1, 0.03 * H + tag_h(PRODUCTION) * 0.75, PRODUCTION, tag_h(PRODUCTION), text = 0, text_x = 0.5, text_y = 0.53, text_size = 18),
+            "wood_prod_tag": widget(assets.SHORT_TAG, 0.06 * W + RESOURCE + RESOURCE * 0.1, 0.03 * H + tag_h(PRODUCTION) * 0.75, PRODUCTION, tag_h(PRODUCTION), text = 0, text_x = 0.5, text_y = 0.53, text_size = 18),
+            "tag_population": widget(assets.MEDIUM_POPULATION, 0.03 * W, tag_h(RESOURCE) + 40, RESOURCE * 0.85, medium_h(RESOURCE * 0.85), text = 0, text_x = 0.45),
+        },
+        "explore": {
+            # Central button, give food when clicked
+            "food_button": widget(assets.SQUARE_PLUS_FOOD, (W - FOOD) / 2, (H - square_h(FOOD)) / 2, square_h(FOOD), FOOD, text = 0, text_x = 0.5, text_y = 0.68),
+            # Wood button
+            "wood_timer": widget(assets.LARGE, W * 0.7 + FOOD * 0.25, (H - square_h(FOOD)) / 2 + (round_h(FOOD * 0.5) - large_h(FOOD * 0.8)) / 2, FOOD * 0.8, large_h(FOOD * 0.8), text_x = 0.58, text_y = 0.55),
+            "wood_button": widget(assets.ROUND_WOOD, W * 0.7, (H - square_h(FOOD)) / 2, FOOD * 0.5, round_h(FOOD * 0.5)),
+        },
+        "manage": {
+            # Buy population button and cost
+            "pop_cost": widget(assets.LARGE_FOOD, 0.03 * W + RESOURCE * 0.85 + 5, tag_h(RESOURCE) + 40, MENU * 0.85, large_h(MENU * 0.85), text = 0, text_x = 0.4),
+            "pop_plus": widget(assets.RIGHT_ARROW_PLUS, 0.03 * W + RESOURCE * 0.85 + MENU * 0.85 + 10, tag_h(RESOURCE) + 44, ARROW * 0.7, arrow_h(ARROW * 0.7)),
+            # Worker menu
+            "harvester_tag": widget(assets.LARGE_HARVESTER, WORKER_X, WORKER_Y, MENU, large_h(MENU), text = 0, text_x = 0.4),
+            "harvester_minus": widget(assets.LEFT_ARROW_MINUS, WORKER_X + MENU + 8, WORKER_Y, ARROW, arrow_h(ARROW)),
+            "harvester_plus": widget(assets.RIGHT_ARROW_PLUS, WORKER_X + MENU + ARROW + 12, WORKER_Y, ARROW, arrow_h(ARROW)),
+            "lumber_tag": widget(assets.LARGE_LUMBERER, WORKER_X, WORKER_Y + large_h(MENU) + 10, MENU, large_h(MENU), text = 0, text_x = 0.4),
+            "lumber_minus": widget(assets.LEFT_ARROW_MINUS, WORKER_X + MENU + 8, WORKER_Y + large_h(MENU) + 10, ARROW, arrow_h(ARROW)),
+            "lumber_plus": widget(assets.RIGHT_ARROW_PLUS, WORKER_X + MENU + ARROW + 12, WORKER_Y + large_h(MENU) + 10, ARROW, arrow_h(ARROW)),
+        },
+        "city": {
+            "building_frame": widget(assets.FRAME, W * 0.625, H * 0.336, W * 0.273, H * 0.439),
+            # A row for every building, a row is square_h(ARROW * 1.3) + 5 pixels high
+            "square_house": widget(assets.SQUARE_HOUSE, WORKER_X, WORKER_Y - 4, ARROW * 1.3, square_h(ARROW * 1.3), text = 0, text_x = 0.5, text_y = 0.46),
+            "house_cost": widget(assets.LARGE_WOOD, WORKER_X + ARROW * 1.3 + 8, WORKER_Y, MENU, large_h(MENU), text = 0, text_x = 0.37, text_size = 24),
+            "house_plus": widget(assets.RIGHT_ARROW_PLUS, WORKER_X + ARROW * 1.3 + MENU + 2 * 8, WORKER_Y, ARROW, arrow_h(ARROW)),
+            "square_granary": widget(assets.SQUARE_GRANARY, WORKER_X, WORKER_Y - 4 + square_h(ARROW * 1.3) + 5, ARROW * 1.3, square_h(ARROW * 1.3), text = 0, text_x = 0.5, text_y = 0.46),
+            "granary_cost": widget(assets.LARGE_WOOD, WORKER_X + ARROW * 1.3 + 8, WORKER_Y + square_h(ARROW * 1.3) + 5, MENU, large_h(MENU), text = 0, text_x = 0.37, text_size = 24),
+            "granary_plus": widget(assets.RIGHT_ARROW_PLUS, WORKER_X + ARROW * 1.3 + MENU + 2 * 8, WORKER_Y + square_h(ARROW * 1.3) + 5, ARROW, arrow_h(ARROW)),
+            "square_storage": widget(assets.SQUARE_STORAGE, WORKER_X, WORKER_Y - 4 + 2 * square_h(ARROW * 1.3) + 10, ARROW * 1.3, square_h(ARROW * 1.3), text = 0, text_x = 0.5, text_y = 0.46),
+            "storage_cost": widget(assets.LARGE_WOOD, WORKER_X + ARROW * 1.3 + 8, WORKER_Y + 2 * square_h(ARROW * 1.3) + 10, MENU, large_h(MENU), text = 0, text_x = 0.37, text_size = 24),
+            "storage_plus": widget(assets.RIGHT_ARROW_PLUS, WORKER_X + ARROW * 1.3 + MENU + 2 * 8, WORKER_Y + 2 * square_h(ARROW * 1.3) + 10, ARROW, arrow_h(ARROW)),
+        },
+        "queue": { # Drawn on building_frame, positions are relative to it
+            "building0": widget(assets.LARGE, (W * 0.273 - MENU) / 2, 0, MENU, large_h(MENU), text_x = 0.58),
+            "building1": widget(assets.LARGE, (W * 0.273 - MENU) / 2, large_h(MENU) + 5, MENU, large_h(MENU), text_x = 0.58),
+            "building2": widget(assets.LARGE, (W * 0.273 - MENU) / 2, 2 * large_h(MENU) + 10, MENU, large_h(MENU), text_x = 0.58),
+            "house": widget(assets.HOUSE, large_h(MENU) * 0.125, large_h(MENU) * 0.125, large_h(MENU) * 0.75, large_h(MENU) * 0.75),
+            "granary": widget(assets.GRANARY, large_h(MENU) * 0.125, large_h(MENU) * 0.125, large_h(MENU) * 0.75, large_h(MENU) * 0.75),
+            "storage": widget(assets.STORAGE, large_h(MENU) * 0.125, large_h(MENU) * 0.125, large_h(MENU) * 0.75, large_h(MENU) * 0.75),
+        },
+    }
+
+# Other pictures shown by images while playing, by image name
+ALTERNATES = {
+    "background": [assets.BACKGROUND_MANAGE, assets.BACKGROUND_CITY],
+    "manage_menu": [assets.LARGE_DISABLED],
+    "explore_menu": [assets.LARGE_DISABLED],
+    "city_menu": [assets.LARGE_DISABLED],
+    "food_button": [assets.SQUARE_PLUS_FOOD_DISABLED],
+    "pop_plus": [assets.RIGHT_ARROW_PLUS_DISABLED],
+    "house_plus": [assets.RIGHT_ARROW_PLUS_DISABLED],
+    "granary_plus": [assets.RIGHT_ARROW_PLUS_DISABLED],
+    "storage_plus": [assets.RIGHT_ARROW_PLUS_DISABLED],
+}
+
+# ----------> Hit test <----------------------------------------
+
+class HitGrid:
+    def __init__(self, targets: list, cell: int = HIT_CELL) -> None:
+        self.cell = cell # Side of a cell in pixels
+        self.cells = {} # Targets overlapping a cell as (image, handler), key is (column, row)
+        for image, handler in targets:
+            self.add(image, handler)
+
+    def add(self, image: assets.Image, handler) -> None:
+        """ Add an image with its handler, where images overlap the one added first is found """
+        for column in range(int(image.x // self.cell), int((image.x + image.w) // self.cell) + 1):
+            for row in range(int(image.y // self.cell), int((image.y + image.h) // self.cell) + 1):
+                self.cells.setdefault((column, row), []).append((image, handler))
+
+    def find(self, point: tuple) -> tuple:
+        """ Return image under a point and its handler, (None, None) if there is no image """
+        for image, handler in self.cells.get((int(point[0] // self.cell), int(point[1] // self.cell)), ()):
+            if image.collide(point):
+                return image, handler
+        return None, None
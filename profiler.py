@@ -0,0 +1,114 @@
+from collections import deque
+from csv import DictWriter
+from json import dumps
+from time import perf_counter_ns
+from pygame import SRCALPHA, Surface
+import assets
+
+# Time spent in each phase of a frame, the game loop calls mark() at the end of every phase and end_frame()
+# at the end of the frame, percentiles are computed on last PROFILE_FRAMES frames
+
+PROFILE_FRAMES = 300 # 5 seconds at 60 fps
+OVERLAY_REFRESH = 30 # Frames between two overlay updates, text changing every frame can't be read
+OVERLAY_FONT = 18
+OVERLAY_COLOR = (255, 255, 255)
+OVERLAY_BACKGROUND = (0, 0, 0, 170)
+
+def percentile(values: list, percent: float) -> float:
+    """ Return the value greater than a percentage of sorted values """
+    return values[min(len(values) - 1, int(len(values) * percent / 100))] if len(values) > 0 else 0
+
+class Profiler:
+    def __init__(self, frames: int = PROFILE_FRAMES, export: str = None) -> None:
+        self.frames = frames # Number of frames kept
+        self.phases = {} # Nanoseconds spent in a phase for last frames, a deque for every phase name
+        self.totals = deque(maxlen = frames) # Nanoseconds of last frames
+        self.current = {} # Nanoseconds spent in each phase of current frame
+        self.start = self.last = perf_counter_ns() # Start of current frame and end of last phase
+        self.count = 0 # Number of frames ended
+        self.file = None if export == None else open(export, 'w', newline = "") # Per-frame timings, .csv or JSON lines
+        self.writer: DictWriter = None # Writes rows if file is .csv, columns are phases of first frame
+
+    def start_frame(self) -> None:
+        """ Start current frame now, time passed since last frame is not counted """
+        self.current = {}
+        self.start = self.last = perf_counter_ns()
+
+    def mark(self, phase: str) -> None:
+        """ End a phase of current frame, it started at end of previous one """
+        now = perf_counter_ns()
+        self.current[phase] = self.current.get(phase, 0) + now - self.last
+        self.last = now
+
+    def skip(self, phase: str) -> None:
+        """ Count a phase that didn't run in current frame as 0, so every frame has the same phases """
+        self.current.setdefault(phase, 0)
+
+    def end_frame(self) -> None:
+        """ Save timings of current frame and start a new one """
+        now = perf_counter_ns()
+        total = now - self.start
+        self.totals.append(total)
+        for phase, spent in self.current.items():
+            if phase not in self.phases:
+                self.phases[phase] = deque(maxlen = self.frames)
+            self.phases[phase].append(spent)
+        if self.file != None:
+            self.export({"frame": self.count, "total": total, **self.current})
+        self.count += 1
+        self.current = {}
+        self.start = self.last = now
+
+    def export(self, row: dict) -> None:
+        """ Write timings of a frame in nanoseconds """
+        if not self.file.name.endswith(".csv"):
+            self.file.write(dumps(row) + "\n")
+            return
+        if self.writer == None:
+            self.writer = DictWriter(self.file, list(row), restval = 0, extrasaction = "ignore")
+            self.writer.writeheader()
+        self.writer.writerow(row)
+
+    def close(self) -> None:
+        """ Close the export file """
+        if self.file != None:
+            self.file.close()
+            self.file = None
+
+    # ----------> Statistics <----------------------------------------
+
+    def stats(self, phase: str = None) -> dict:
+        """ Return mean, percentiles and max in milliseconds of a phase, of whole frames if phase is None """
+        values = sorted(self.totals if phase == None else self.phases.get(phase, []))
+        return {
+            "mean": sum(values) / max(len(values), 1) / 10 ** 6,
+            "p50": percentile(values, 50) / 10 ** 6,
+            "p95": percentile(values, 95) / 10 ** 6,
+            "p99": percentile(values, 99) / 10 ** 6,
+            "max": (values[-1] if len(values) > 0 else 0) / 10 ** 6,
+        }
+
+    def fps(self) -> float:
+        """ Return frames per second of last frames """
+        return len(self.totals) * 10 ** 9 / max(sum(self.totals), 1)
+
+    def report(self, top: int = 5) -> list:
+        """ Return lines with fps, frame time and phases with the highest 95th percentile """
+        frame = self.stats()
+        lines = [f"{self.fps():.0f} fps - frame {frame['p50']:.1f} ms, p95 {frame['p95']:.1f} ms, max {frame['max']:.1f} ms"]
+        phases = sorted(((self.stats(phase), phase) for phase in self.phases), key = lambda item: -item[0]["p95"])
+        for stats, phase in phases[:top]:
+            lines.append(f"{phase}: {stats['mean']:.2f} ms, p95 {stats['p95']:.2f} ms, max {stats['max']:.2f} ms")
+        return lines
+
+    def overlay(self) -> Surface:
+        """ Return a panel with report() lines for drawing on screen """
+        font = assets.get_font(OVERLAY_FONT)
+        lines = [font.render(line, True, OVERLAY_COLOR) for line in self.report()]
+        panel = Surface((max(line.get_width() for line in lines) + 12, sum(line.get_height() for line in lines) + 12), SRCALPHA)
+        panel.fill(OVERLAY_BACKGROUND)
+        y = 6
+        for line in lines:
+            panel.blit(line, (6, y))
+            y += line.get_height()
+        return panel
@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+from json import dumps, loads
+import pygame
+from engine import Game
+
+# Record a playing session for replay.py: first line is the game when session starts, then a line for every frame
+# with frame time in microseconds, mouse position if it moved and input events, last line is the game when quitting
+
+RECORDING_VERSION = 1
+SKIPPED_EVENTS = {pygame.MOUSEMOTION} # Mouse position is saved every frame
+
+def snapshot(game: Game) -> dict:
+    """ Return game stats with starting time of events in microseconds, saves have only seconds """
+    data = game.serialize()
+    data["starting_times"] = [None if event.starting_time == None else event.starting_time.isoformat() for event in game.events.queue]
+    return data
+
+def restore(data: dict) -> Game:
+    """ Return a game from a snapshot, without offline production """
+    game = Game.from_dict({**data, "time": ""})
+    for event, starting_time in zip(list(game.events.queue), data["starting_times"]):
+        event.starting_time = None if starting_time == None else datetime.fromisoformat(starting_time)
+    return game
+
+def final_stats(game: Game) -> dict:
+    """ Return game stats compared at the end of a replay, time is only when the game was saved """
+    return {key: value for key, value in game.serialize().items() if key != "time"}
+
+def encode_event(event: pygame.event.Event) -> list:
+    """ Return an input event as a list of type and attributes that can be saved as JSON """
+    return [event.type, {key: value for key, value in event.dict.items() if isinstance(value, (int, float, str, bool, tuple, list))}]
+
+def decode_event(event: list) -> pygame.event.Event:
+    """ Return an input event saved by encode_event() """
+    return pygame.event.Event(event[0], {key: tuple(value) if isinstance(value, list) else value for key, value in event[1].items()})
+
+class Recorder:
+    def __init__(self, path: str) -> None:
+        self.file = open(path, 'w') # Recording file
+        self.mouse = None # Last mouse position saved
+
+    def start(self, game: Game, time: datetime) -> None:
+        """ Save game and time when the first frame starts """
+        self.file.write(dumps({"version": RECORDING_VERSION, "start": time.isoformat(), "game": snapshot(game)}) + "\n")
+
+    def frame(self, now: datetime, last_frame: datetime, mouse: tuple, input_events: list) -> None:
+        """ Save frame time, mouse position if changed and input events of a frame """
+        record = [(now - last_frame) // timedelta(microseconds = 1)] # Exact, a float could be rounded
+        if mouse != self.mouse or len(input_events) > 0:
+            record += list(mouse)
+            self.mouse = mouse
+        record += [encode_event(event) for event in input_events if event.type not in SKIPPED_EVENTS]
+        self.file.write(dumps(record, separators = (",", ":")) + "\n")
+
+    def finish(self, game: Game) -> None:
+        """ Save game stats when quitting and close the file """
+        self.file.write(dumps({"final": final_stats(game)}) + "\n")
+        self.file.close()
+
+def read_recording(path: str) -> tuple:
+    """ Return header, list of frames and final game stats (None if the session didn't quit) of a recording """
+    with open(path, 'r') as file:
+        lines = file.read().splitlines()
+    header = loads(lines[0])
+    if header.get("version") != RECORDING_VERSION:
+        raise ValueError(f"Unknown recording version {header.get('version')}")
+    frames, final = [], None
+    for line in lines[1:]:
+        record = loads(line)
+        if isinstance(record, dict):
+            final = record["final"]
+        else:
+            frames.append(record)
+    return header, frames, final
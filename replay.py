@@ -0,0 +1,79 @@
+from argparse import ArgumentParser
+from asyncio import run
+from datetime import datetime
+import os
+from time import perf_counter
+import pygame
+import events
+from recorder import decode_event, final_stats, read_recording, restore
+from ui import Ui
+
+# Replay sessions recorded with Ui(record = path) without window and as fast as possible,
+# time is a virtual clock moved by recorded frame times so the game ends as it ended when recording
+
+async def play(ui: Ui, clock: events.VirtualClock, frames: list, draw: bool = False) -> int:
+    """ Feed recorded frames to Ui until the end or until quitting, return number of frames played """
+    last_frame, mouse = clock.tick(), (0, 0)
+    for played, frame in enumerate(frames, 1):
+        clock.advance(frame[0] / 10 ** 6)
+        now = clock.tick()
+        if len(frame) > 1:
+            mouse = (frame[1], frame[2])
+        input_events = [decode_event(event) for event in frame[3:]]
+        types = [event.type for event in input_events]
+        quitting = pygame.QUIT in types
+        if quitting: # Game stats were recorded at quit, following events were never handled
+            input_events = input_events[:types.index(pygame.QUIT)]
+        await ui.update((now - last_frame).total_seconds(), now, mouse, input_events)
+        if quitting:
+            return played
+        last_frame = now
+        if draw:
+            await ui.draw()
+            ui.scene.render()
+    return len(frames)
+
+def replay(path: str, draw: bool = False) -> dict:
+    """ Replay a recording, return final game stats, the ones recorded and replay stats """
+    header, frames, final = read_recording(path)
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # No window
+    clock, old_clock = events.VirtualClock(datetime.fromisoformat(header["start"])), events.CLOCK
+    events.set_clock(clock)
+    try:
+        ui = Ui(game = restore(header["game"]))
+        start = perf_counter()
+        played = run(play(ui, clock, frames, draw))
+        elapsed = perf_counter() - start
+    finally:
+        events.set_clock(old_clock)
+    return {
+        "path": path,
+        "stats": final_stats(ui.game),
+        "expected": final,
+        "frames": played,
+        "game_seconds": ui.session_time,
+        "seconds": elapsed,
+    }
+
+def main() -> None:
+    parser = ArgumentParser(description = "Replay recorded sessions and check that the game ends the same")
+    parser.add_argument("recordings", nargs = "+", help = "files written by Ui(record = path)")
+    parser.add_argument("--draw", action = "store_true", help = "draw every frame, slower")
+    args = parser.parse_args()
+    failed = 0
+    for path in args.recordings:
+        result = replay(path, args.draw)
+        speed = result["game_seconds"] / max(result["seconds"], 1e-9)
+        if result["expected"] == None:
+            status = "not checked, session didn't quit"
+        elif result["stats"] == result["expected"]:
+            status = "ok"
+        else:
+            failed += 1
+            changed = [key for key in result["expected"] if result["stats"].get(key) != result["expected"][key]]
+            status = f"FAILED, different {', '.join(changed)}"
+        print(f"{path}: {status} - {result['frames']} frames, {result['game_seconds']:.1f}s played in {result['seconds']:.2f}s ({speed:.0f}x)")
+    raise SystemExit(1 if failed > 0 else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+from json import dumps, loads
+from os import path, fsync, replace, remove
+import os
+from struct import Struct, error as StructError
+import tempfile
+
+SAVE_FILE = "savegame.txt"
+BACKUP_COUNT = 3 # Number of old saves kept as savegame.txt.1, savegame.txt.2, ...
+SAVE_FORMAT = "binary" # Format used for writing, "json" or "binary", reading detects it from the file
+
+# ----------> Binary format <----------------------------------------
+# A header with game stats and number of events, then a record for every event followed by its name and type,
+# times are formatted strings padded with zeros, version 0 is the old JSON save: it's read as it is and written again as binary
+
+SAVE_MAGIC = b"CLKS"
+SAVE_VERSION = 1
+HEADER = Struct("<4sHiddiiiii19sH") # Magic, version, population, food, wood, house, granary, storage, harvester, lumber, time, events, stats are signed: starvation can take a worker that doesn't exist
+EVENT = Struct("<HHd19sI") # Name length, type length, counter, starting time, timedelta seconds
+
+def encode_save(data: dict) -> bytes:
+    """ Return serialized game stats packed in binary format """
+    events = data["events"]
+    chunks = [HEADER.pack(SAVE_MAGIC, SAVE_VERSION, data["population"],
+                          data["resource"]["food"], data["resource"]["wood"],
+                          data["building"]["house"], data["building"]["granary"], data["building"]["storage"],
+                          data["occupation"]["harvester"], data["occupation"]["lumber"],
+                          data["time"].encode(), len(events))]
+    for event in events:
+        name, type = event["name"].encode(), event["type"].encode()
+        chunks.append(EVENT.pack(len(name), len(type), float(event["counter"]),
+                                 event["starting_time"].encode(), int(event["timedelta"])))
+        chunks += [name, type]
+    return b"".join(chunks)
+
+def decode_save(content: bytes) -> dict:
+    """ Return game stats from a binary save as Game.serialize() does, raise an error if content is not valid """
+    magic, version, population, food, wood, house, granary, storage, harvester, lumber, time, count = HEADER.unpack_from(content)
+    if magic != SAVE_MAGIC or version != SAVE_VERSION:
+        raise ValueError(f"Unknown save format version {version}")
+    offset, events = HEADER.size, []
+    for _ in range(count):
+        name_length, type_length, counter, starting_time, seconds = EVENT.unpack_from(content, offset)
+        offset += EVENT.size
+        name = content[offset:offset + name_length].decode()
+        type = content[offset + name_length:offset + name_length + type_length].decode()
+        offset += name_length + type_length
+        events.append({
+            "name": name,
+            "type": type,
+            "counter": counter,
+            "starting_time": starting_time.rstrip(b"\0").decode(),
+            "timedelta": seconds
+        })
+    if offset != len(content):
+        raise ValueError("Save file has trailing data")
+    return {
+        "population": population,
+        "resource": {
+            "food": food,
+            "wood": wood
+            },
+        "building": {
+            "house": house,
+            "granary": granary,
+            "storage": storage
+            },
+        "occupation": {
+            "harvester": harvester,
+            "lumber": lumber
+            },
+        "time": time.rstrip(b"\0").decode(),
+        "events": events
+        }
+
+def encode(data: dict, format: str = SAVE_FORMAT) -> bytes:
+    """ Return serialized game stats as file content in a format, "json" or "binary" """
+    if format == "binary":
+        return encode_save(data)
+    if format == "json":
+        return dumps(data).encode()
+    raise ValueError(f"Unknown save format {format}")
+
+def parse_save(content: bytes) -> dict:
+    """ Return game stats from file content, binary saves start with SAVE_MAGIC, else it's an old JSON save """
+    if content.startswith(SAVE_MAGIC):
+        return decode_save(content)
+    return loads(content)
+
+# ----------> Files <----------------------------------------
+
+def backup_path(save_path: str, number: int) -> str:
+    """ Return the path of a backup, 1 is the newest """
+    return f"{save_path}.{number}"
+
+def sync_directory(directory: str) -> None:
+    """ Flush a directory entry to disk so a rename survives a crash, not supported on Windows """
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        fsync(fd)
+    finally:
+        os.close(fd)
+
+def rotate_backups(save_path: str, backups: int = BACKUP_COUNT) -> None:
+    """ Shift backups by one, current save become the newest backup and the oldest is dropped """
+    if backups <= 0:
+        return
+    for number in range(backups - 1, 0, -1):
+        if path.exists(backup_path(save_path, number)):
+            replace(backup_path(save_path, number), backup_path(save_path, number + 1))
+    if path.exists(save_path):
+        replace(save_path, backup_path(save_path, 1))
+
+def write_save(data: dict, save_path: str = SAVE_FILE, backups: int = BACKUP_COUNT, format: str = SAVE_FORMAT) -> None:
+    """ Write serialized game stats in a format (see encode()) with write_file() """
+    write_file(encode(data, format), save_path, backups)
+
+def write_file(content: bytes, file_path: str, backups: int = BACKUP_COUNT) -> None:
+    """ Write content to a temporary file, flush it to disk and then rename it over the old file,
+        so a crash never leaves a half written file """
+    directory = path.dirname(path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(prefix = path.basename(file_path) + ".", suffix = ".tmp", dir = directory)
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content)
+            file.flush()
+            fsync(file.fileno())
+        rotate_backups(file_path, backups)
+        replace(temp_path, file_path)
+    except:
+        if path.exists(temp_path):
+            remove(temp_path)
+        raise
+    sync_directory(directory)
+
+def read_saves(save_path: str = SAVE_FILE, backups: int = BACKUP_COUNT):
+    """ Yield every readable save as a dictionary, newest first: save file then backups """
+    for candidate in [save_path] + [backup_path(save_path, number) for number in range(1, backups + 1)]:
+        try:
+            with open(candidate, 'rb') as file:
+                yield parse_save(file.read())
+        except (OSError, ValueError, StructError):
+            continue
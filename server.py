@@ -0,0 +1,382 @@
+from argparse import ArgumentParser
+from asyncio import IncompleteReadError, create_task, gather, open_connection, open_unix_connection, run, sleep, start_server, start_unix_server
+from concurrent.futures import ThreadPoolExecutor
+from heapq import heappop, heappush
+from json import dumps, loads
+from os import listdir, makedirs, path
+from random import Random
+from struct import Struct, error as StructError
+from sys import stderr
+from time import monotonic, perf_counter
+from engine import LazyGame
+from profiler import percentile
+from savefile import decode_save, encode_save, write_file
+import events
+
+# Host many games in one process: clients send requests over TCP or a Unix socket. Games are LazyGame, they are moved
+# forward only when a request uses them or when one of their events ends, so idle games cost nothing.
+# Games are saved in shard files of SHARD_SIZE games, only shards with changed games are written.
+# Every message is a LENGTH prefix followed by a payload: a request is REQUEST with op, game id, action and argument,
+# a response is RESPONSE with status and game id followed by a binary save (see savefile.py), stats or an error
+
+TICK_INTERVAL = 1 # In seconds, time between two scheduler ticks completing ended events
+TICK_BATCH = 1000 # Games moved forward before letting clients be served
+PERSIST_INTERVAL = 30 # In seconds, minimum time between two saves
+SHARD_SIZE = 1024 # Games saved in the same file
+SAVE_DIRECTORY = "saves"
+HOST, PORT = "127.0.0.1", 8765
+
+LENGTH = Struct("<I") # Payload length
+REQUEST = Struct("<BIBi") # Op, game id, action, argument
+RESPONSE = Struct("<BI") # Status, game id
+SHARD_RECORD = Struct("<II") # Game id, save length, followed by the save
+
+OP_CREATE, OP_STATE, OP_ACTION, OP_REMOVE, OP_STATS = 1, 2, 3, 4, 5
+OK, ERROR = 0, 1
+
+# Actions clients can do by index, argument is how many to buy or move, gathering has no argument
+ACTIONS = ["food_gathering", "wood_gathering", "increment_population", "increment_harvester", "decrement_harvester",
+           "increment_lumber", "decrement_lumber", "increment_house", "increment_granary", "increment_storage"]
+GATHERING = {"food_gathering", "wood_gathering"}
+BUILDINGS = {"increment_house", "increment_granary", "increment_storage"}
+
+def error(message: str, game_id: int = 0) -> bytes:
+    """ Return an error response """
+    return RESPONSE.pack(ERROR, game_id) + message.encode()
+
+# ----------> Shards <----------------------------------------
+
+def shard_path(directory: str, shard: int) -> str:
+    """ Return the path of a shard file """
+    return path.join(directory, f"shard_{shard}.bin")
+
+def encode_shard(saves: list) -> bytes:
+    """ Return content of a shard file from a list of (game id, serialized game) """
+    chunks = []
+    for game_id, data in saves:
+        save = encode_save(data)
+        chunks += [SHARD_RECORD.pack(game_id, len(save)), save]
+    return b"".join(chunks)
+
+def decode_shard(content: bytes) -> list:
+    """ Return a list of (game id, serialized game) from content of a shard file """
+    offset, saves = 0, []
+    while offset < len(content):
+        game_id, length = SHARD_RECORD.unpack_from(content, offset)
+        offset += SHARD_RECORD.size
+        saves.append((game_id, decode_save(content[offset:offset + length])))
+        offset += length
+    return saves
+
+def write_shards(directory: str, shards: dict) -> None:
+    """ Write shard files, shards is a dictionary of lists of (game id, serialized game) by shard number """
+    makedirs(directory, exist_ok = True)
+    for shard, saves in shards.items():
+        write_file(encode_shard(saves), shard_path(directory, shard), 0)
+
+def read_shards(directory: str):
+    """ Yield (game id, serialized game) of every game saved in a directory, damaged shards are skipped """
+    if not path.isdir(directory):
+        return
+    for name in sorted(listdir(directory)):
+        if name.startswith("shard_") and name.endswith(".bin"):
+            try:
+                with open(path.join(directory, name), 'rb') as file:
+                    yield from decode_shard(file.read())
+            except (OSError, ValueError, StructError):
+                continue
+
+# ----------> Server <----------------------------------------
+
+class Server:
+    def __init__(self, directory: str = SAVE_DIRECTORY, tick_interval: float = TICK_INTERVAL, persist_interval: float = PERSIST_INTERVAL) -> None:
+        self.directory = directory # Shard files directory, None if games are not saved
+        self.tick_interval = tick_interval # Seconds between two scheduler ticks
+        self.persist_interval = persist_interval # Minimum seconds between two saves
+        self.games = {} # Hosted games by id
+        self.deadlines = [] # Heap of (next event deadline, game id), entries no more in watched are skipped
+        self.watched = {} # Next event deadline of every game with events
+        self.dirty = set() # Shards changed since last save
+        self.next_id = 1 # Id of next created game
+        self.executor = ThreadPoolExecutor(max_workers = 1) # Shards are written on a worker, one save at a time
+        self.pending = None # Future of the save in progress
+        self.saving = set() # Shards written by the save in progress
+        self.last_persist = monotonic() # Time of last save
+        self.requests = 0 # Number of requests served
+        self.tick_time = 0.0 # Seconds spent by last scheduler tick
+
+    def load(self) -> None:
+        """ Load saved games, time passed while the server was down is offline production """
+        for game_id, data in read_shards(self.directory):
+            try:
+                self.add(LazyGame.from_dict(data), game_id)
+            except (KeyError, TypeError, ValueError):
+                continue
+
+    def add(self, game: LazyGame, game_id: int = None) -> int:
+        """ Host a game and return its id """
+        game_id = self.next_id if game_id == None else game_id
+        self.next_id = max(self.next_id, game_id + 1)
+        self.games[game_id] = game
+        self.dirty.add(game_id // SHARD_SIZE)
+        self.watch(game_id)
+        return game_id
+
+    def remove(self, game_id: int) -> None:
+        """ Stop hosting a game, it's dropped from its shard at next save """
+        del self.games[game_id]
+        self.watched.pop(game_id, None)
+        self.dirty.add(game_id // SHARD_SIZE)
+
+    def watch(self, game_id: int) -> None:
+        """ Remember when next event of a game ends, the scheduler moves the game forward then """
+        deadline = self.games[game_id].next_deadline()
+        if deadline == None:
+            self.watched.pop(game_id, None)
+        elif self.watched.get(game_id) != deadline:
+            self.watched[game_id] = deadline
+            heappush(self.deadlines, (deadline, game_id))
+
+    def settle(self, game_id: int, time) -> LazyGame:
+        """ Move a game forward to a time and return it """
+        game = self.games[game_id]
+        game.settle(time)
+        self.dirty.add(game_id // SHARD_SIZE)
+        self.watch(game_id)
+        return game
+
+    def snapshot(self, game: LazyGame) -> dict:
+        """ Save current time in game and return game stats """
+        game.time = events.current_time()
+        return game.serialize()
+
+    def stats(self) -> dict:
+        """ Return number of games and requests and duration of last tick """
+        return {"games": len(self.games), "watched": len(self.watched), "requests": self.requests, "tick_ms": self.tick_time * 1000}
+
+    def handle(self, payload: bytes) -> bytes:
+        """ Serve a request and return the response """
+        self.requests += 1
+        try:
+            op, game_id, action, argument = REQUEST.unpack(payload)
+        except StructError:
+            return error("Malformed request")
+        now = events.CLOCK.tick()
+        if op == OP_CREATE:
+            return RESPONSE.pack(OK, self.add(LazyGame()))
+        if op == OP_STATS:
+            return RESPONSE.pack(OK, 0) + dumps(self.stats()).encode()
+        if game_id not in self.games:
+            return error("Unknown game", game_id)
+        if op == OP_REMOVE:
+            self.remove(game_id)
+            return RESPONSE.pack(OK, game_id)
+        if op == OP_ACTION and argument < 0:
+            return error("Bad argument", game_id)
+        try:
+            game = self.settle(game_id, now) # Actions see resources produced until now
+            if op == OP_STATE:
+                return RESPONSE.pack(OK, game_id) + encode_save(self.snapshot(game))
+            if op == OP_ACTION and 0 <= action < len(ACTIONS):
+                name = ACTIONS[action]
+                if name in GATHERING:
+                    getattr(game, name)()
+                elif name in BUILDINGS:
+                    getattr(game, name)(True, argument)
+                else:
+                    getattr(game, name)(argument)
+                self.watch(game_id) # Action may have started an event
+                return RESPONSE.pack(OK, game_id)
+        except (ArithmeticError, TypeError, ValueError, StructError) as exception: # A broken game must not drop the connection
+            return error(f"Game error: {exception}", game_id)
+        return error("Unknown request", game_id)
+
+    async def serve_client(self, reader, writer) -> None:
+        """ Serve requests of a connection until it's closed """
+        try:
+            while True:
+                length, = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+                response = self.handle(await reader.readexactly(length))
+                writer.write(LENGTH.pack(len(response)) + response)
+                await writer.drain()
+        except (IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def tick(self) -> None:
+        """ Move forward games with an event ended, every TICK_BATCH games clients are served """
+        start, done = perf_counter(), 0
+        now = events.CLOCK.tick()
+        while len(self.deadlines) > 0 and self.deadlines[0][0] <= now:
+            deadline, game_id = heappop(self.deadlines)
+            if self.watched.get(game_id) != deadline: # Game removed or deadline changed
+                continue
+            del self.watched[game_id]
+            self.settle(game_id, now)
+            done += 1
+            if done % TICK_BATCH == 0:
+                await sleep(0)
+                now = events.CLOCK.tick()
+        self.tick_time = perf_counter() - start
+
+    def check_save(self) -> None:
+        """ Wait for the save in progress, if it failed report it and mark its shards changed so they are saved again """
+        if self.pending is not None and self.pending.exception() != None:
+            print(f"Saving shards failed: {self.pending.exception()!r}", file = stderr)
+            self.dirty |= self.saving
+        self.pending, self.saving = None, set()
+
+    def persist(self, every: bool = False) -> None:
+        """ Write changed shards, or every shard, on the worker thread, games are serialized now """
+        if every:
+            self.dirty.update(game_id // SHARD_SIZE for game_id in self.games)
+        if self.pending is not None and not self.pending.done():
+            return # Previous save still in progress, changed shards are saved next time
+        self.check_save()
+        if self.directory == None or len(self.dirty) == 0:
+            return
+        shards = {shard: [] for shard in self.dirty}
+        for game_id, game in self.games.items():
+            if game_id // SHARD_SIZE in shards:
+                shards[game_id // SHARD_SIZE].append((game_id, self.snapshot(game)))
+        self.saving, self.dirty = self.dirty, set()
+        self.last_persist = monotonic()
+        self.pending = self.executor.submit(write_shards, self.directory, shards)
+
+    async def schedule(self) -> None:
+        """ Tick all games every tick_interval and save them every persist_interval """
+        while True:
+            await sleep(self.tick_interval)
+            await self.tick()
+            if monotonic() - self.last_persist >= self.persist_interval:
+                self.persist()
+
+    async def serve(self, host: str = HOST, port: int = PORT, socket_path: str = None) -> None:
+        """ Serve clients on a TCP port or on a Unix socket until cancelled, then save all games,
+            idle games are saved with current time so time the server was running is not offline time """
+        if socket_path != None:
+            server = await start_unix_server(self.serve_client, socket_path)
+        else:
+            server = await start_server(self.serve_client, host, port)
+        scheduler = create_task(self.schedule())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            scheduler.cancel()
+            self.check_save() # A failed save must not prevent the final one
+            self.persist(every = True)
+            self.executor.shutdown(wait = True)
+
+# ----------> Client <----------------------------------------
+
+class Client:
+    def __init__(self, reader, writer) -> None:
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host: str = HOST, port: int = PORT, socket_path: str = None):
+        """ Return a client connected to a server """
+        if socket_path != None:
+            return cls(*await open_unix_connection(socket_path))
+        return cls(*await open_connection(host, port))
+
+    async def request(self, op: int, game_id: int = 0, action: int = 0, argument: int = 0) -> tuple:
+        """ Send a request and return status, game id and body of the response """
+        payload = REQUEST.pack(op, game_id, action, argument)
+        self.writer.write(LENGTH.pack(len(payload)) + payload)
+        length, = LENGTH.unpack(await self.reader.readexactly(LENGTH.size))
+        response = await self.reader.readexactly(length)
+        status, game_id = RESPONSE.unpack_from(response)
+        if status != OK:
+            raise ValueError(response[RESPONSE.size:].decode())
+        return status, game_id, response[RESPONSE.size:]
+
+    async def create(self) -> int:
+        """ Create a game and return its id """
+        return (await self.request(OP_CREATE))[1]
+
+    async def state(self, game_id: int) -> dict:
+        """ Return stats of a game as Game.serialize() does """
+        return decode_save((await self.request(OP_STATE, game_id))[2])
+
+    async def action(self, game_id: int, name: str, argument: int = 1) -> None:
+        """ Do an action of ACTIONS in a game """
+        await self.request(OP_ACTION, game_id, ACTIONS.index(name), argument)
+
+    async def remove(self, game_id: int) -> None:
+        """ Remove a game from the server """
+        await self.request(OP_REMOVE, game_id)
+
+    async def stats(self) -> dict:
+        """ Return server stats """
+        return loads((await self.request(OP_STATS))[2])
+
+    async def close(self) -> None:
+        self.writer.close()
+        await self.writer.wait_closed()
+
+# ----------> Load test <----------------------------------------
+
+async def player(client: Client, games: list, seconds: float, random: Random, latencies: list) -> None:
+    """ Play random games until seconds pass: mostly gathering and reading state, sometimes buying """
+    names = ["food_gathering"] * 6 + ["wood_gathering", "increment_population", "increment_harvester", "increment_lumber", "increment_house"]
+    end = perf_counter() + seconds
+    while perf_counter() < end:
+        game_id = random.choice(games)
+        start = perf_counter()
+        if random.random() < 0.3:
+            await client.state(game_id)
+        else:
+            await client.action(game_id, random.choice(names))
+        latencies.append(perf_counter() - start)
+
+async def load_test(games: int, clients: int, seconds: float, host: str = HOST, port: int = PORT, socket_path: str = None, seed: int = 1) -> dict:
+    """ Create games on a server, then play them from some clients and return request rate and latencies """
+    connections = [await Client.connect(host, port, socket_path) for _ in range(clients)]
+    start = perf_counter()
+    ids = [await connections[index % clients].create() for index in range(games)]
+    created = perf_counter() - start
+    latencies = []
+    start = perf_counter()
+    await gather(*(player(client, ids, seconds, Random(seed + index), latencies) for index, client in enumerate(connections)))
+    elapsed = perf_counter() - start
+    stats = await connections[0].stats()
+    for client in connections:
+        await client.close()
+    latencies.sort()
+    return {
+        "games": games,
+        "create_seconds": created,
+        "requests": len(latencies),
+        "requests_per_second": len(latencies) / max(elapsed, 1e-9),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "server": stats,
+    }
+
+def main() -> None:
+    parser = ArgumentParser(description = "Host many games over a socket, or load test a server")
+    parser.add_argument("mode", choices = ["serve", "load"])
+    parser.add_argument("--host", default = HOST)
+    parser.add_argument("--port", type = int, default = PORT)
+    parser.add_argument("--socket", help = "Unix socket path, used instead of host and port")
+    parser.add_argument("--directory", default = SAVE_DIRECTORY, help = "where games are saved")
+    parser.add_argument("--games", type = int, default = 10000, help = "games created by load test")
+    parser.add_argument("--clients", type = int, default = 8, help = "connections used by load test")
+    parser.add_argument("--seconds", type = float, default = 10, help = "load test duration")
+    args = parser.parse_args()
+    if args.mode == "serve":
+        server = Server(args.directory)
+        server.load()
+        try:
+            run(server.serve(args.host, args.port, args.socket))
+        except KeyboardInterrupt:
+            pass
+    else:
+        print(dumps(run(load_test(args.games, args.clients, args.seconds, args.host, args.port, args.socket)), indent = 4))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from datetime import datetime
+from json import dumps, load
+from time import perf_counter
+from engine import Game
+from savefile import parse_save
+import events
+
+# ----------> Scenarios <----------------------------------------
+# A scenario is a function returning a new game and a script,
+# script is a list of (second, action, arguments) with action a Game method
+
+START_TIME = datetime(2000, 1, 1) # Virtual time when a simulation starts
+
+def early_game() -> tuple:
+    """ New game with some clicks for food and a wood gathering """
+    script = [(second * 0.5, "food_gathering", []) for second in range(60)]
+    script += [(30, "wood_gathering", []), (200, "increment_population", [2]), (201, "increment_harvester", [2])]
+    return Game(population = 2, food = 100, harvester = 1, lumber = 1), script
+
+def many_workers() -> tuple:
+    """ Late game with 1000 workers and big limits """
+    game = Game(population = 1000, food = 10 ** 6, wood = 10 ** 6, harvester = 600, lumber = 400, house = 99, granary = 40, storage = 100)
+    return game, [(60 * minute, "wood_gathering", []) for minute in range(10)]
+
+def build_queue() -> tuple:
+    """ Building queue always full, a new building is bought every 10 seconds """
+    game = Game(population = 50, wood = 10 ** 9, harvester = 25, lumber = 25, storage = 10 ** 5)
+    actions = ["increment_house", "increment_granary", "increment_storage"]
+    return game, [(10 * second, actions[second % 3], [True]) for second in range(360)]
+
+SCENARIOS = {
+    "early": early_game,
+    "workers": many_workers,
+    "build_queue": build_queue,
+}
+
+# ----------> Simulation <----------------------------------------
+
+class Simulation:
+    def __init__(self, game: Game, script: list = None, start: datetime = START_TIME, timings: bool = False) -> None:
+        self.game = game
+        self.clock = events.VirtualClock(start) # Injected in events while running, time moves only with ticks
+        self.script = sorted(script or [], key = lambda action: action[0]) # Scripted player actions
+        self.next_action = 0 # Index of next action in script
+        self.ticks = 0 # Ticks done
+        self.timings = {} if timings else None # Seconds spent in each method, if enabled
+
+    @contextmanager
+    def virtual_time(self):
+        """ Make events use the simulation clock, the previous clock is put back after """
+        clock = events.CLOCK
+        events.set_clock(self.clock)
+        try:
+            yield
+        finally:
+            events.set_clock(clock)
+
+    def call(self, name: str, *args) -> None:
+        """ Call a game method, measuring time spent in it if timings are enabled """
+        if self.timings == None:
+            getattr(self.game, name)(*args)
+            return
+        start = perf_counter()
+        getattr(self.game, name)(*args)
+        self.timings[name] = self.timings.get(name, 0) + perf_counter() - start
+
+    def seconds(self) -> float:
+        """ Return seconds simulated """
+        return self.ticks / self.game.fps
+
+    def run_actions(self) -> None:
+        """ Run scripted actions with a time less or equal of current time """
+        while self.next_action < len(self.script) and self.script[self.next_action][0] <= self.seconds():
+            _, name, args = self.script[self.next_action]
+            self.call(name, *args)
+            self.next_action += 1
+
+    def tick(self) -> None:
+        """ A tick of the game loop: production, events and then player actions """
+        self.ticks += 1
+        self.clock.advance(1 / self.game.fps)
+        self.call("mine")
+        self.call("update_events", self.clock.now())
+        self.run_actions()
+
+    def run(self, seconds: float) -> None:
+        """ Tick the game for some seconds of game time """
+        with self.virtual_time():
+            for _ in range(int(round(seconds * self.game.fps))):
+                self.tick()
+
+    def fast_forward(self, seconds: float) -> None:
+        """ Move the game forward with Game.advance() between scripted actions """
+        end = self.ticks + int(round(seconds * self.game.fps))
+        with self.virtual_time():
+            while self.ticks < end:
+                until = end
+                if self.next_action < len(self.script):
+                    until = min(end, max(self.ticks + 1, int(round(self.script[self.next_action][0] * self.game.fps))))
+                self.call("advance", (until - self.ticks) / self.game.fps, self.clock.now())
+                self.clock.advance((until - self.ticks) / self.game.fps)
+                self.ticks = until
+                self.run_actions()
+
+def main() -> None:
+    parser = ArgumentParser(description = "Run the game without window as fast as possible")
+    parser.add_argument("scenario", nargs = "?", default = "early", help = f"one of {', '.join(SCENARIOS)} or a save file")
+    parser.add_argument("--seconds", type = float, default = 600, help = "game time to simulate")
+    parser.add_argument("--script", help = "JSON file with a list of [second, action, arguments]")
+    parser.add_argument("--advance", action = "store_true", help = "use Game.advance() instead of ticking")
+    args = parser.parse_args()
+
+    start = START_TIME
+    if args.scenario in SCENARIOS:
+        game, script = SCENARIOS[args.scenario]()
+    else:
+        with open(args.scenario, 'rb') as file:
+            data = parse_save(file.read())
+        start = events.get_time(data["time"]) if data["time"] != "" else START_TIME # Events are timed from save
+        data["time"] = "" # No offline production
+        game, script = Game.from_dict(data), []
+    if args.script != None:
+        with open(args.script, 'r') as file:
+            script = [tuple(action) for action in load(file)]
+
+    simulation = Simulation(game, script, start)
+    start = perf_counter()
+    simulation.fast_forward(args.seconds) if args.advance else simulation.run(args.seconds)
+    elapsed = perf_counter() - start
+    print(dumps(game.serialize(), indent = 2))
+    print(f"{simulation.ticks} ticks in {elapsed:.3f}s ({simulation.ticks / max(elapsed, 1e-9):.0f} ticks/s)")
+
+if __name__ == "__main__":
+    main()
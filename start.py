@@ -1,4 +1,11 @@
+from argparse import ArgumentParser
 from ui import Ui
 from asyncio import run
 
-run(Ui().run())
\ No newline at end of file
+parser = ArgumentParser(description = "Simple idle game")
+parser.add_argument("--record", help = "save input of the session in a file, for replay.py")
+parser.add_argument("--profile", help = "save time spent in each phase of every frame in a .csv or JSON lines file")
+parser.add_argument("--resizable", action = "store_true", help = "let the window be resized, pictures are scaled to its size")
+parser.add_argument("--journal", action = "store_true", help = "log every action in a journal instead of saving the whole game, see journal.py")
+args = parser.parse_args()
+run(Ui(journal = args.journal, record = args.record, profile = args.profile, resizable = args.resizable).run())
@@ -0,0 +1,9 @@
+from batch import BatchGame
+from engine import Game
+
+def test_exported_time_is_moved_forward():
+    saved, unsaved = Game(population = 5, food = 200, harvester = 2).serialize(), Game().serialize()
+    saved["time"] = "2024-05-01T12:30:00"
+    games = BatchGame([saved, unsaved])
+    games.advance(90 * 60)
+    assert [save["time"] for save in games.serialize()] == ["2024-05-01T14:00:00", ""]
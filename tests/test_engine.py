@@ -0,0 +1,98 @@
+from random import Random
+from typing import Callable
+import pytest
+from engine import Game, repeat_tick
+
+def repeat_tick_by_tick(value: float, step: float, limit: int, ticks: int, minimum: float = None) -> tuple:
+    """ Return value and ticks done as repeat_tick() does, one tick at a time as Game.mine() does """
+    for done in range(ticks):
+        next_value = round(min(value + step, limit), 2)
+        if next_value == value:
+            break
+        if minimum != None and next_value < minimum:
+            return value, done
+        value = next_value
+    return value, ticks
+
+def test_repeat_tick_matches_ticks():
+    random = Random(5)
+    for _ in range(500):
+        step = (random.choice([0, 0, 1, 2, 17, 123]) + random.choice([0.5, 0.5, 0.25])) / 100 * random.choice([1, -1])
+        value = max(-100, round(random.uniform(-300, 3000) * random.choice([1, 10, 1000]), 2)) # Food under -100 starves people
+        limit = random.choice([10 ** 9, int(abs(value)) + random.randint(0, 5000)])
+        minimum = random.choice([None, -100])
+        ticks = random.randint(0, 5000)
+        assert repeat_tick(value, step, limit, ticks, minimum) == repeat_tick_by_tick(value, step, limit, ticks, minimum)
+
+def tick_and_advance(population: int, harvester: int, lumber: int, food: float, wood: float, fps: int, seconds: int) -> tuple:
+    """ Return stats of a game after some seconds of Game.mine() ticks and of the same game after Game.advance() """
+    ticked = Game(population, food, wood, harvester, lumber)
+    ticked.fps = fps
+    for _ in range(seconds * fps):
+        ticked.mine()
+    advanced = Game(population, food, wood, harvester, lumber)
+    advanced.fps = fps
+    advanced.advance(seconds)
+    return advanced.serialize(), ticked.serialize()
+
+@pytest.mark.parametrize("population, harvester, lumber, food, wood", [
+    (3, 0, 0, 30, 0), # Early game, food goes down by half a hundredth every tick
+    (5, 1, 1, 200, 50),
+    (9, 2, 3, 1500.37, 2222.22),
+    (40, 5, 20, 0, 0),
+])
+@pytest.mark.parametrize("fps", [30, 60])
+def test_advance_matches_mine(population, harvester, lumber, food, wood, fps):
+    advanced, ticked = tick_and_advance(population, harvester, lumber, food, wood, fps, 20)
+    assert advanced == ticked
+
+def test_long_advance_matches_mine():
+    advanced, ticked = tick_and_advance(3, 0, 0, 30, 0, 60, 10 * 60)
+    assert advanced == ticked
+
+# ----------> Bulk buying <----------------------------------------
+
+def affordable(budget: float, cost: Callable[[int], int]) -> int:
+    """ Return how many units can be paid one at a time, cost(n) is the displayed cost of the n-th next unit """
+    count = 0
+    while cost(count) <= budget:
+        budget -= cost(count)
+        count += 1
+    return count
+
+def test_exact_cost_buys_people():
+    game = Game(population = 8, food = 107, house = 10)
+    assert game.population_cost() == 107
+    game.increment_population(1)
+    assert (game.population, game.food) == (9, 0)
+
+@pytest.mark.parametrize("name, stats", [
+    ("House", {"house": 5, "wood": 2488}),
+    ("Granary", {"granary": 3, "wood": 5184}),
+    ("Storage", {"storage": 2, "wood": 24000}),
+])
+def test_exact_cost_buys_buildings(name, stats):
+    game = Game(**stats)
+    increment, cost = getattr(game, f"increment_{name.lower()}"), getattr(game, f"{name.lower()}_cost")
+    assert cost() == game.wood
+    increment(True)
+    assert (game.events.count(name), game.wood) == (1, 0)
+
+def test_bulk_people_cost_is_sum_of_unit_costs():
+    for population in range(0, 60, 3):
+        for food in range(0, 20000, 397):
+            game = Game(population = population, food = food, house = 100)
+            cost = lambda n: int(round(50 * 1.1 ** (population + n)))
+            count = game.population_buy_limit()
+            assert count == affordable(food, cost)
+            game.increment_population(count)
+            assert game.food == food - sum(cost(n) for n in range(count))
+
+def test_building_limit_is_unit_costs():
+    for total in range(0, 30, 2):
+        for wood in range(0, 300000, 4999):
+            game = Game(wood = wood, house = total, granary = total, storage = total)
+            game.max_buildings = 10 ** 6
+            assert game.building_buy_limit("House") == affordable(wood, lambda n: int(round(1000 * 1.2 ** (total + n))))
+            assert game.building_buy_limit("Granary") == affordable(wood, lambda n: int(round(3000 * 1.2 ** (total + n))))
+            assert game.building_buy_limit("Storage") == affordable(wood, lambda n: 8000 * (1 + total + n))
@@ -0,0 +1,95 @@
+from json import dumps
+from struct import error as StructError
+import pytest
+from engine import Game
+from savefile import SAVE_MAGIC, backup_path, decode_save, encode, encode_save, parse_save, read_saves, write_save
+
+def sample_save() -> dict:
+    """ Return stats of a game with workers, buildings in construction and a resource event """
+    game = Game(population = 8, food = 120.5, wood = 5000.25, harvester = 3, lumber = 2, house = 1, granary = 1, storage = 0)
+    game.increment_house(True)
+    game.increment_granary(True)
+    game.wood_gathering()
+    game.time = "2024-05-01T12:30:00"
+    return game.serialize()
+
+def starved_save() -> dict:
+    """ Return stats of a game where starvation took a lumberer that didn't exist, as Game.mine() does """
+    game = Game(population = 1, food = -100)
+    game.fps = 1
+    game.mine()
+    return game.serialize()
+
+def overwrite(file_path: str, content: bytes) -> None:
+    """ Replace a file content without rotating backups, as a crash or a broken disk does """
+    with open(file_path, 'wb') as file:
+        file.write(content)
+
+# ----------> Round trips <----------------------------------------
+
+def test_binary_round_trip():
+    data = sample_save()
+    assert len(data["events"]) == 3
+    assert decode_save(encode_save(data)) == data
+
+def test_text_to_binary_to_text():
+    data = sample_save()
+    text = dumps(data).encode()
+    binary = encode(parse_save(text), "binary")
+    assert binary.startswith(SAVE_MAGIC)
+    assert parse_save(encode(parse_save(binary), "json")) == data
+
+# ----------> Out of range stats <----------------------------------------
+
+def test_negative_stats_round_trip():
+    data = starved_save()
+    assert data["occupation"]["lumber"] == -1
+    assert decode_save(encode_save(data)) == data
+
+def test_unknown_version_is_rejected():
+    content = bytearray(encode_save(sample_save()))
+    content[4] = 99
+    with pytest.raises(ValueError):
+        decode_save(bytes(content))
+
+# ----------> Files <----------------------------------------
+
+def test_old_text_save_loads(tmp_path):
+    data = sample_save()
+    save_path = str(tmp_path / "savegame.txt")
+    write_save(data, save_path, format = "json")
+    with open(save_path, 'rb') as file:
+        assert not file.read().startswith(SAVE_MAGIC)
+    assert next(read_saves(save_path)) == data
+
+def test_truncated_save_falls_back_to_backup(tmp_path):
+    old, new = sample_save(), starved_save()
+    save_path = str(tmp_path / "savegame.txt")
+    write_save(old, save_path)
+    write_save(new, save_path)
+    with open(save_path, 'rb') as file:
+        content = file.read()
+    overwrite(save_path, content[:len(content) // 2])
+    with pytest.raises(StructError):
+        decode_save(content[:len(content) // 2])
+    assert next(read_saves(save_path)) == old
+
+@pytest.mark.parametrize("damage", [
+    lambda content: b"XXXX" + content[4:], # Magic overwritten, read as JSON
+    lambda content: content + b"\0", # Trailing data
+    lambda content: b"", # Empty file
+])
+def test_corrupted_save_falls_back_to_backup(tmp_path, damage):
+    old = sample_save()
+    save_path = str(tmp_path / "savegame.txt")
+    write_save(old, save_path)
+    write_save(starved_save(), save_path)
+    overwrite(save_path, damage(encode_save(starved_save())))
+    assert next(read_saves(save_path)) == old
+
+def test_missing_save_and_backups(tmp_path):
+    save_path = str(tmp_path / "savegame.txt")
+    assert list(read_saves(save_path)) == []
+    write_save(sample_save(), save_path)
+    assert len(list(read_saves(save_path))) == 1
+    assert not (tmp_path / backup_path("savegame.txt", 1)).exists()
@@ -0,0 +1,11 @@
+import events
+from simulate import SCENARIOS, START_TIME, Simulation
+
+def test_simulation_puts_back_the_clock():
+    clock = events.CLOCK
+    game, script = SCENARIOS["early"]()
+    simulation = Simulation(game, script)
+    simulation.run(5)
+    simulation.fast_forward(5)
+    assert events.CLOCK is clock
+    assert (simulation.clock.now() - START_TIME).total_seconds() > 9.9
@@ -1,23 +1,20 @@
+from datetime import datetime
 import pygame
 import assets
-from engine import load_game
-
-# Lambdas who calculate button heigth given width
-large_h = lambda large_w: int(round(large_w * 0.364, 0))
-medium_h = lambda large_w: int(round(large_w * 0.434, 0))
-tag_h = lambda large_w: int(round(large_w * 0.526, 0))
-tag_h = lambda large_w: int(round(large_w * 0.615, 0))
-square_h = lambda square_w: int(round(square_w * 1.09, 0))
-round_h = lambda round_w: int(round(round_w * 1.03, 0))
-arrow_h = lambda round_w: int(round(round_w * 1.25, 0))
-
-# Base button width and position
-RESOURCE = 230
-PRODUCTION = RESOURCE * 0.55
-FOOD = 200
-MENU = 275
-ARROW = 80
-WORKER_X, WORKER_Y = 70, 280
+import events
+from autosave import Autosave
+from engine import Game, Stepper, load_game
+from journal import Journal, recover
+from layout import BASE_HEIGHT, BASE_WIDTH, FIRST_FRAME, HitGrid, fit_size, layout, pictures
+from profiler import OVERLAY_REFRESH, Profiler
+from recorder import Recorder
+
+# Screen refresh rate, independent from game speed
+RENDER_FPS = 60
+BACKGROUND_FPS = 5 # When window is not focused
+MAX_IDLE_TIME = 5 # In seconds, longest sleep waiting for input when nothing changes on screen
+
+BUY_MAX_BUTTON = 3 # Right click on a plus button buys as many as possible
 
 # Color
 BLACK = (0, 0, 0)
@@ -28,111 +25,254 @@ class Ui:
     MANAGE = 1
     CITY = 2
 
-    def __init__(self) -> None:
+    def __init__(self, render_fps: int = RENDER_FPS, background_fps: int = BACKGROUND_FPS, journal: bool = False, game: Game = None, record: str = None, profile: str = None, resizable: bool = False) -> None:
         pygame.init()
         self.clock = pygame.time.Clock()
 
-        self.W = 1024 # Width
-        self.H = self.W * 3 // 4 # Height, display aspect ratio 4:3
-        self.display = pygame.display.set_mode((self.W, self.H))
+        self.W = BASE_WIDTH # Width
+        self.H = BASE_HEIGHT # Height, display aspect ratio 4:3
+        self.display = pygame.display.set_mode((self.W, self.H), pygame.RESIZABLE if resizable else 0)
         pygame.display.set_caption("Clicker")
+        self.scene = assets.Scene(self.display) # Draw only what changed since last frame
 
+        self.preloader = assets.start_preloading() # Pictures are decoded in background threads
+        self.loading = True # True until all pictures are loaded
+        self.baking: assets.Preloader = None # Loads pictures for a new window size, images are replaced when it's done
+        self.baking_size: tuple = None # Screen size of pictures loaded by baking
         self.init_images()
-        self.game = load_game()
+        if game != None: # Game given by replay.py, it's not saved
+            self.game = game
+        else:
+            self.game = recover() if journal else load_game() # In journal mode actions are appended to a log, see journal.py
         self.fps = self.game.fps # Game frame per second
+        self.stepper = Stepper(self.game) # Run game ticks for real time elapsed
+        self.init_hits()
+        self.render_fps = render_fps # Screen frame per second
+        self.background_fps = background_fps # Screen frame per second when window is not focused
+        self.focused = True # True if window has focus
+        self.visible = True # False if window is minimized or hidden, nothing drawn can be seen
+        self.woken_by = [] # Input event that ended an idle wait, handled in next frame
+        self.autosave = None # Save the game while playing, None if game is not saved
+        if game == None:
+            self.autosave = Journal() if journal else Autosave()
+            if journal:
+                self.autosave.attach(self.game)
+        self.recorder = None if record == None else Recorder(record) # Save input of the session for replay.py
+        self.session_time = 0.0 # Seconds of frame time from start, used instead of pygame.time.get_ticks() so replays see the same time
+        self.profiler = Profiler(export = profile) # Time spent in each phase of a frame, exported to a file if profile is given
+        self.show_profile = False # Show profiler overlay, toggled with F3
+        self.profile_panel = None # Overlay, updated every OVERLAY_REFRESH frames
 
         self.current_menu = self.EXPLORE
         self.press_time = 0 # Time when a button pressing started
         self.starting_position = (0, 0) # For dragging image
+        self.building_frame_shown: tuple = None # Frame image, buildings and position drawn in building frame, see draw_city_menu()
         self.mouse = (0, 0) # Current mouse position
 
     def init_images(self) -> None:
         """ Initialize image """
-        self.background = assets.Image(assets.BACKGROUND_EXPLORE, 0, 0, self.W, self.H)
-        # Central button, give food when clicked
-        self.food_button = assets.Image(assets.SQUARE_PLUS_FOOD, (self.W - FOOD) / 2, (self.H - square_h(FOOD)) / 2, square_h(FOOD), FOOD, 0, 0.5, 0.68)
-        # Wood button
-        self.wood_timer = assets.Image(assets.LARGE, self.W * 0.7 + FOOD * 0.25, (self.H - square_h(FOOD)) / 2 + (round_h(FOOD * 0.5) - large_h(FOOD * 0.8)) / 2, FOOD * 0.8, large_h(FOOD * 0.8), "", 0.58, 0.55)
-        self.wood_button = assets.Image(assets.ROUND_WOOD, self.W * 0.7, (self.H - square_h(FOOD)) / 2, FOOD * 0.5, round_h(FOOD * 0.5))
-        # Bottom menu button
-        self.manage_menu = assets.Image(assets.LARGE, (self.W - 3 * MENU) // 4, self.H - large_h(MENU) - 20, MENU, large_h(MENU), "Manage", text_size=30)
-        self.explore_menu = assets.Image(assets.LARGE, (self.W - 3 * MENU) * 2 // 4 + MENU, self.H - large_h(MENU) - 20, MENU, large_h(MENU), "Explore", text_size=30)
-        self.city_menu = assets.Image(assets.LARGE, (self.W - 3 * MENU) * 3 // 4 + 2 * MENU, self.H - large_h(MENU) - 20, MENU, large_h(MENU), "City", text_size=30)
-        # Tag with current resources
-        self.food_tag = assets.Image(assets.LARGE_FOOD, 0.03 * self.W, 0.03 * self.H, RESOURCE, large_h(RESOURCE), 0, text_x=0.4, text_size=23)
-        self.wood_tag = assets.Image(assets.LARGE_WOOD, 0.06 * self.W + RESOURCE, 0.03 * self.H, RESOURCE, large_h(RESOURCE), 0, text_x=0.4, text_size=23)
-        self.food_prod_tag = assets.Image(assets.SHORT_TAG, 0.03 * self.W + RESOURCE * 0.1, 0.03 * self.H + tag_h(PRODUCTION) * 0.75, PRODUCTION, tag_h(PRODUCTION), 0, text_x = 0.5, text_y = 0.53, text_size=18)
-        self.wood_prod_tag = assets.Image(assets.SHORT_TAG, 0.06 * self.W + RESOURCE + RESOURCE * 0.1, 0.03 * self.H + tag_h(PRODUCTION) * 0.75, PRODUCTION, tag_h(PRODUCTION), 0, text_x = 0.5, text_y = 0.53, text_size=18)
-        self.tag_population = assets.Image(assets.MEDIUM_POPULATION, 0.03 * self.W, tag_h(RESOURCE) + 40, RESOURCE * 0.85, medium_h(RESOURCE * 0.85), 0, 0.45)
-        # Buy population button and cost
-        self.pop_cost = assets.Image(assets.LARGE_FOOD, 0.03 * self.W + RESOURCE * 0.85 + 5, tag_h(RESOURCE) + 40, MENU * 0.85, large_h(MENU * 0.85), 0, 0.4)
-        self.pop_plus = assets.Image(assets.RIGHT_ARROW_PLUS, 0.03 * self.W + RESOURCE * 0.85 + MENU * 0.85 + 10, tag_h(RESOURCE) + 44, ARROW * 0.7, arrow_h(ARROW * 0.7))
-        # Worker menu
-        self.harvester_tag = assets.Image(assets.LARGE_HARVESTER, WORKER_X, WORKER_Y, MENU, large_h(MENU), 0, 0.4)
-        self.harvester_minus = assets.Image(assets.LEFT_ARROW_MINUS, WORKER_X + MENU + 8, WORKER_Y, ARROW, arrow_h(ARROW))
-        self.harvester_plus = assets.Image(assets.RIGHT_ARROW_PLUS, WORKER_X + MENU + ARROW + 12, WORKER_Y, ARROW, arrow_h(ARROW))
-        self.lumber_tag = assets.Image(assets.LARGE_LUMBERER, WORKER_X, WORKER_Y + large_h(MENU) + 10, MENU, large_h(MENU), 0, 0.4)
-        self.lumber_minus = assets.Image(assets.LEFT_ARROW_MINUS, WORKER_X + MENU + 8, WORKER_Y + large_h(MENU) + 10, ARROW, arrow_h(ARROW))
-        self.lumber_plus = assets.Image(assets.RIGHT_ARROW_PLUS, WORKER_X + MENU + ARROW + 12, WORKER_Y + large_h(MENU) + 10, ARROW, arrow_h(ARROW))
-        # City menu
-        self.building_frame = assets.Image(assets.FRAME, self.W * 0.625, self.H * 0.336, self.W * 0.273, self.H * 0.439)
-        self.square_house = assets.Image(assets.SQUARE_HOUSE, WORKER_X, WORKER_Y - 4, ARROW * 1.3, square_h(ARROW * 1.3), 0, 0.5, 0.46)
-        self.house_cost = assets.Image(assets.LARGE_WOOD, WORKER_X + ARROW * 1.3 + 8, WORKER_Y, MENU, large_h(MENU), 0, 0.37, text_size=24)
-        self.house_plus = assets.Image(assets.RIGHT_ARROW_PLUS, WORKER_X + ARROW * 1.3 + MENU + 2*  8, WORKER_Y, ARROW, arrow_h(ARROW))
-        self.square_granary = assets.Image(assets.SQUARE_GRANARY, WORKER_X, WORKER_Y - 4 + square_h(ARROW * 1.3) + 5, ARROW * 1.3, square_h(ARROW * 1.3), 0, 0.5, 0.46)
-        self.granary_cost = assets.Image(assets.LARGE_WOOD, WORKER_X + ARROW * 1.3 + 8, WORKER_Y + square_h(ARROW * 1.3) + 5, MENU, large_h(MENU), 0, 0.37, text_size=24)
-        self.granary_plus = assets.Image(assets.RIGHT_ARROW_PLUS, WORKER_X + ARROW * 1.3 + MENU + 2*  8, WORKER_Y + square_h(ARROW * 1.3) + 5, ARROW, arrow_h(ARROW))
-        self.square_storage = assets.Image(assets.SQUARE_STORAGE, WORKER_X, WORKER_Y - 4 + 2 * square_h(ARROW * 1.3) + 10, ARROW * 1.3, square_h(ARROW * 1.3), 0, 0.5, 0.46)
-        self.storage_cost = assets.Image(assets.LARGE_WOOD, WORKER_X + ARROW * 1.3 + 8, WORKER_Y + 2 * square_h(ARROW * 1.3) + 10, MENU, large_h(MENU), 0, 0.37, text_size=24)
-        self.storage_plus = assets.Image(assets.RIGHT_ARROW_PLUS, WORKER_X + ARROW * 1.3 + MENU + 2*  8, WORKER_Y + 2 * square_h(ARROW * 1.3) + 10, ARROW, arrow_h(ARROW))
-        self.building0 = assets.Image(assets.LARGE, (self.W * 0.273 - MENU) / 2, 0, MENU, large_h(MENU), text_x = 0.58)
-        self.building1 = assets.Image(assets.LARGE, (self.W * 0.273 - MENU) / 2, large_h(MENU) + 5, MENU, large_h(MENU), text_x = 0.58)
-        self.building2 = assets.Image(assets.LARGE, (self.W * 0.273 - MENU) / 2, 2 * large_h(MENU) + 10, MENU, large_h(MENU), text_x = 0.58)
-        self.house = assets.Image(assets.HOUSE, large_h(MENU) * 0.125, large_h(MENU) * 0.125, large_h(MENU) * 0.75, large_h(MENU) * 0.75)
-        self.granary = assets.Image(assets.GRANARY, large_h(MENU) * 0.125, large_h(MENU) * 0.125, large_h(MENU) * 0.75, large_h(MENU) * 0.75)
-        self.storage = assets.Image(assets.STORAGE, large_h(MENU) * 0.125, large_h(MENU) * 0.125, large_h(MENU) * 0.75, large_h(MENU) * 0.75)
+        for table, widgets in layout(self.W, self.H).items():
+            if table not in FIRST_FRAME: # Pictures of other menus are loaded after first frame
+                self.preloader.pause()
+            for name, (picture, x, y, w, h, options) in widgets.items():
+                setattr(self, name, assets.Image(picture, x, y, w, h, **options))
+        # Pictures changed while playing
+        for path, size in pictures(self.W, self.H):
+            self.preloader.request(path, size)
+
+    def init_hits(self) -> None:
+        """ Initialize hit test of clickable images, handlers are menu to show, game actions
+            or (action, limit) for buttons that buy more than one """
+        self.menu_hits = HitGrid([(self.manage_menu, self.MANAGE), (self.explore_menu, self.EXPLORE), (self.city_menu, self.CITY)])
+        self.hits = {
+            self.EXPLORE: HitGrid([(self.food_button, self.game.food_gathering), (self.wood_button, self.game.wood_gathering)]),
+            self.MANAGE: HitGrid([
+                (self.pop_plus, (self.game.increment_population, self.game.population_buy_limit)),
+                (self.harvester_plus, (self.game.increment_harvester, self.game.unemployed)),
+                (self.harvester_minus, (self.game.decrement_harvester, lambda: self.game.harvester)),
+                (self.lumber_plus, (self.game.increment_lumber, self.game.unemployed)),
+                (self.lumber_minus, (self.game.decrement_lumber, lambda: self.game.lumber)),
+            ]),
+            self.CITY: HitGrid([
+                (self.house_plus, self.game.increment_house),
+                (self.granary_plus, self.game.increment_granary),
+                (self.storage_plus, self.game.increment_storage),
+                (self.building_frame, None),
+            ]),
+        }
+
+    def hit(self) -> tuple:
+        """ Return image of current menu under the mouse and its handler """
+        return self.hits[self.current_menu].find(self.mouse)
+
+    def resize(self, width: int, height: int) -> None:
+        """ Start loading all pictures scaled for a window size in background threads,
+            current images are drawn until they are loaded so no picture is scaled while playing """
+        self.display = self.scene.display = pygame.display.get_surface()
+        self.display.fill(BLACK) # Window area out of the screen
+        self.scene.invalidate()
+        size = fit_size(width, height)
+        if size == (self.baking_size if self.baking != None else (self.W, self.H)):
+            return
+        if self.baking != None: # Pictures for the previous size are not needed anymore
+            self.baking.close()
+        self.baking, self.baking_size = assets.start_preloading(), size
+        for path, picture_size in pictures(*size):
+            self.baking.request(path, picture_size)
+
+    def apply_size(self) -> None:
+        """ Replace all images with the ones for the new window size, at once between two frames """
+        self.W, self.H = self.baking_size
+        self.preloader.close()
+        self.preloader, self.baking = self.baking, None
+        self.init_images()
+        self.init_hits()
+        self.display.fill(BLACK)
+        self.scene.invalidate()
+
+    def show_loading(self) -> None:
+        """ Show pictures loading progress in window title until all are loaded """
+        if self.preloader.is_done():
+            pygame.display.set_caption("Clicker")
+            self.loading = False
+        else:
+            pygame.display.set_caption("Clicker - loading {}/{}".format(*self.preloader.progress()))
 
     async def run(self) -> None:
         """ Core loop of the game """
+        last_frame = events.CLOCK.tick()
+        if self.recorder != None:
+            self.recorder.start(self.game, last_frame)
+        self.profiler.start_frame()
         while True:
-            # Generate resource and manage event
-            await self.game.autominer()
-            await self.game.manage_event()
-            self.mouse = pygame.mouse.get_pos()
-            # Before game events / user input
-            await self.loop_explore_menu()
-            await self.loop_manage_menu()
-            await self.loop_city_menu()
-            # Game events / user input
-            for event in pygame.event.get():
-                await self.event_menu(event)
-                await self.event_explore_menu(event)
-                await self.event_manage_menu(event)
-                await self.event_city_menu(event)
+            if self.loading:
+                self.show_loading()
+            if self.baking != None and self.baking.is_done():
+                self.apply_size()
+            # Generate resource and manage event for time elapsed since last frame, then user input
+            now = events.CLOCK.tick() # Time is read once per frame
+            mouse, input_events = pygame.mouse.get_pos(), self.woken_by + pygame.event.get()
+            self.woken_by = []
+            if self.recorder != None:
+                self.recorder.frame(now, last_frame, mouse, input_events)
+            self.profiler.mark("input")
+            await self.update((now - last_frame).total_seconds(), now, mouse, input_events)
+            last_frame = now
             # Draw screen
-            await self.draw_menu()
-            await self.draw_counters()
-            await self.draw_explore_menu()
-            await self.draw_manage_menu()
-            await self.draw_city_menu()
+            await self.draw()
             # Update screen and save
-            pygame.display.update()
-            self.clock.tick(self.fps)
-            await self.game.save_current_time()
-            await self.game.save_game()
+            areas = self.scene.render()
+            self.profiler.mark("render")
+            pygame.display.update(areas)
+            self.profiler.mark("display")
+            self.preloader.resume() # First frame is shown, load pictures of other menus
+            idle_time = self.idle_time(now) if len(input_events) == 0 else 0
+            if idle_time > 1 / self.render_fps: # Nothing to show for some frames, game catches up on wake
+                self.idle(idle_time)
+            else:
+                self.clock.tick(self.render_fps if self.focused else self.background_fps)
+            self.profiler.mark("wait")
+            if self.autosave != None:
+                await self.autosave.tick(self.game)
+            self.profiler.mark("save")
+            self.profiler.end_frame()
+
+    async def update(self, elapsed: float, now: datetime, mouse: tuple, input_events: list) -> None:
+        """ Run game ticks for seconds elapsed until now and manage user input of a frame, used by replay.py too """
+        self.stepper.update(elapsed, now)
+        self.session_time += elapsed
+        self.mouse = mouse
+        self.profiler.mark("ticks")
+        # Before game events / user input
+        await self.loop_explore_menu()
+        self.profiler.mark("loop_explore")
+        await self.loop_manage_menu()
+        self.profiler.mark("loop_manage")
+        await self.loop_city_menu()
+        self.profiler.mark("loop_city")
+        # Game events / user input
+        handlers = (("events_menu", self.event_menu), ("events_explore", self.event_explore_menu),
+                    ("events_manage", self.event_manage_menu), ("events_city", self.event_city_menu))
+        for event in input_events:
+            for phase, handler in handlers:
+                await handler(event)
+                self.profiler.mark(phase)
+        for phase, _ in handlers: # Frames without input have these phases too
+            self.profiler.skip(phase)
+
+    async def draw(self) -> None:
+        """ Draw all the screen """
+        await self.draw_menu()
+        self.profiler.mark("draw_menu")
+        await self.draw_counters()
+        self.profiler.mark("draw_counters")
+        await self.draw_explore_menu()
+        self.profiler.mark("draw_explore")
+        await self.draw_manage_menu()
+        self.profiler.mark("draw_manage")
+        await self.draw_city_menu()
+        self.profiler.mark("draw_city")
+        if self.show_profile:
+            if self.profile_panel == None or self.profiler.count % OVERLAY_REFRESH == 0:
+                self.profile_panel = self.profiler.overlay()
+            self.scene.blit(self.profile_panel, (8, 8))
+        self.profiler.mark("draw_overlay")
+
+    def idle_time(self, now: datetime) -> float:
+        """ Return seconds until something on screen changes if no input comes, 0 if it's animated """
+        if self.loading or self.baking != None or self.press_time > 0 or self.starting_position != (0, 0):
+            return 0 # Loading progress, resizing, fast buy and dragging change every frame
+        if self.current_menu == self.CITY and self.building0.y > 0:
+            return 0 # Building queue is moving up
+        if not self.visible:
+            return MAX_IDLE_TIME
+        idle_time = min(MAX_IDLE_TIME, self.game.next_counter_change())
+        for event in self.game.events.queue: # Timers show seconds left
+            if event.starting_time != None:
+                idle_time = min(idle_time, (event.ending_time(now) - now).total_seconds() % 1)
+        return idle_time
+
+    def idle(self, seconds: float) -> None:
+        """ Sleep until an input event comes or for some seconds """
+        event = pygame.event.wait(int(seconds * 1000))
+        if event.type != pygame.NOEVENT:
+            self.woken_by.append(event)
+        self.clock.tick() # Next frame is not delayed for the time slept
+
+    def ticks(self) -> int:
+        """ Return milliseconds of frame time from start """
+        return int(self.session_time * 1000)
 
     async def event_menu(self, event: pygame.event) -> None:
         """ Manage user event in the all menu """
         if event.type == pygame.QUIT:
+            if self.recorder != None:
+                self.recorder.finish(self.game)
+            if self.autosave != None:
+                self.autosave.flush(self.game)
+            self.profiler.close()
             pygame.quit()
+            raise SystemExit
+
+        if event.type == pygame.VIDEORESIZE:
+            self.resize(event.w, event.h)
+
+        if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED):
+            self.scene.invalidate() # Window content may be lost, draw all again
+
+        if event.type in (pygame.WINDOWMINIMIZED, pygame.WINDOWHIDDEN, pygame.WINDOWRESTORED, pygame.WINDOWSHOWN, pygame.WINDOWMAXIMIZED):
+            self.visible = event.type not in (pygame.WINDOWMINIMIZED, pygame.WINDOWHIDDEN)
+
+        if event.type in (pygame.WINDOWFOCUSGAINED, pygame.WINDOWFOCUSLOST):
+            self.focused = event.type == pygame.WINDOWFOCUSGAINED
+
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+            self.show_profile = not self.show_profile
 
         if event.type == pygame.MOUSEBUTTONUP:
-            if self.manage_menu.collide(self.mouse):
-                self.current_menu = self.MANAGE
-            if self.explore_menu.collide(self.mouse):
-                self.current_menu = self.EXPLORE
-            if self.city_menu.collide(self.mouse):
-                self.current_menu = self.CITY
+            image, menu = self.menu_hits.find(self.mouse)
+            if image != None:
+                self.current_menu = menu
 
     async def draw_menu(self) -> None:
         """ Draw bottom menu and change background """
@@ -149,23 +289,23 @@ class Ui:
         self.explore_menu.change(assets.LARGE_DISABLED if self.current_menu == self.EXPLORE else assets.LARGE)
         self.manage_menu.change(assets.LARGE_DISABLED if self.current_menu == self.MANAGE else assets.LARGE)
 
-        self.background.draw(self.display)
-        self.city_menu.draw(self.display)
-        self.explore_menu.draw(self.display)
-        self.manage_menu.draw(self.display)
+        self.background.draw(self.scene)
+        self.city_menu.draw(self.scene)
+        self.explore_menu.draw(self.scene)
+        self.manage_menu.draw(self.scene)
 
     async def draw_counters(self) -> None:
         """ Update resources and production counter """
         # Food counter
         if self.game.harvester_production() != 0:
-            self.food_prod_tag.draw(self.display, text = self.game.format_harvester_production())
-        self.food_tag.draw(self.display, text = self.game.format_food())
+            self.food_prod_tag.draw(self.scene, text = self.game.format_harvester_production())
+        self.food_tag.draw(self.scene, text = self.game.format_food())
         # Wood counter
         if self.game.lumber_production() != 0:
-            self.wood_prod_tag.draw(self.display, text = self.game.format_lumber_production())
-        self.wood_tag.draw(self.display, text = self.game.format_wood())
+            self.wood_prod_tag.draw(self.scene, text = self.game.format_lumber_production())
+        self.wood_tag.draw(self.scene, text = self.game.format_wood())
         # Population counter
-        self.tag_population.draw(self.display, text = self.game.format_population())
+        self.tag_population.draw(self.scene, text = self.game.format_population())
 
     # --------------------> 🔭 EXPLORE 🔭 <---------------------------------------------
 
@@ -179,10 +319,9 @@ class Ui:
         if self.current_menu == self.EXPLORE:
 
             if event.type == pygame.MOUSEBUTTONUP:
-                if self.food_button.collide(self.mouse):
-                    self.game.food_gathering()
-                elif self.wood_button.collide(self.mouse):
-                    self.game.wood_gathering()
+                image, gathering = self.hit()
+                if image != None:
+                    gathering()
 
     async def draw_explore_menu(self) -> None:
         """ Draw button in the explore menu """
@@ -190,15 +329,15 @@ class Ui:
             
             # Wood+ button and timer
             if self.game.events.exist("WoodPlus"):
-                self.wood_timer.draw(self.display, text = self.game.events.get("WoodPlus").format_lasting_time())
+                self.wood_timer.draw(self.scene, text = self.game.events.get("WoodPlus").format_lasting_time())
                 self.food_button.change(assets.SQUARE_PLUS_FOOD_DISABLED)
                 self.food_button.set_text(self.game.format_food_gathering(), GREY) # Set text grey
             else:
                 self.food_button.change(assets.SQUARE_PLUS_FOOD)
                 self.food_button.set_text(self.game.format_food_gathering())
-            self.wood_button.draw(self.display)
+            self.wood_button.draw(self.scene)
             # Central food+ button
-            self.food_button.draw(self.display)
+            self.food_button.draw(self.scene)
 
     # --------------------> 🪓 MANAGE 🪓 <---------------------------------------------
 
@@ -206,49 +345,50 @@ class Ui:
         """ Executed at the start of every loop in the manage menu """
         if self.current_menu == self.MANAGE:
 
-            fast_buy = lambda collide: collide * (((pygame.time.get_ticks() - self.press_time) // 1000) ** 2)
             if self.press_time > 0: # Fast buy when long press button
-                self.game.increment_population(fast_buy(self.pop_plus.collide(self.mouse)))
-                self.game.increment_harvester(fast_buy(self.harvester_plus.collide(self.mouse)))
-                self.game.decrement_harvester(fast_buy(self.harvester_minus.collide(self.mouse)))
-                self.game.increment_lumber(fast_buy(self.lumber_plus.collide(self.mouse)))
-                self.game.decrement_lumber(fast_buy(self.lumber_minus.collide(self.mouse)))
+                image, buy = self.hit()
+                if image != None:
+                    buy[0](((self.ticks() - self.press_time) // 1000) ** 2)
 
     async def event_manage_menu(self, event: pygame.event) -> None:
         """ Manage user event in the manage menu """
         if self.current_menu == self.MANAGE:
 
-            if event.type == pygame.MOUSEBUTTONDOWN:
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button != BUY_MAX_BUTTON:
                 if self.press_time == 0: # Save time when start pressing button
-                    self.press_time = pygame.time.get_ticks()
+                    self.press_time = self.ticks()
 
-            if event.type == pygame.MOUSEBUTTONUP:
+            if event.type == pygame.MOUSEBUTTONUP and event.button == BUY_MAX_BUTTON:
+                image, buy = self.hit()
+                if image != None:
+                    action, limit = buy
+                    action(limit())
+
+            elif event.type == pygame.MOUSEBUTTONUP:
                 press_time = self.press_time
                 self.press_time = 0
-                if pygame.time.get_ticks() - press_time > 1000:
+                if self.ticks() - press_time > 1000:
                     return # Otherwise this will buy an item more when relasing the button
 
-                self.game.increment_population(self.pop_plus.collide(self.mouse))
-                self.game.increment_harvester(self.harvester_plus.collide(self.mouse))
-                self.game.decrement_harvester(self.harvester_minus.collide(self.mouse))
-                self.game.increment_lumber(self.lumber_plus.collide(self.mouse))
-                self.game.decrement_lumber(self.lumber_minus.collide(self.mouse))
+                image, buy = self.hit()
+                if image != None:
+                    buy[0](1)
 
     async def draw_manage_menu(self) -> None:
         """ Draw button in the manage menu """
         if self.current_menu == self.MANAGE:
 
             # Harvester buttons
-            self.harvester_tag.draw(self.display, text = self.game.format_harvester())
-            self.harvester_plus.draw(self.display)
-            self.harvester_minus.draw(self.display)
+            self.harvester_tag.draw(self.scene, text = self.game.format_harvester())
+            self.harvester_plus.draw(self.scene)
+            self.harvester_minus.draw(self.scene)
             # Lumber buttons
-            self.lumber_tag.draw(self.display, text = self.game.format_lumber())
-            self.lumber_plus.draw(self.display)
-            self.lumber_minus.draw(self.display)
+            self.lumber_tag.draw(self.scene, text = self.game.format_lumber())
+            self.lumber_plus.draw(self.scene)
+            self.lumber_minus.draw(self.scene)
             # Population+ button and cost
-            self.pop_cost.draw(self.display, text = self.game.format_population_cost())
-            self.pop_plus.draw(self.display)
+            self.pop_cost.draw(self.scene, text = self.game.format_population_cost())
+            self.pop_plus.draw(self.scene)
             
     # --------------------> 🏡 CITY 🏡 <---------------------------------------------
 
@@ -263,68 +403,60 @@ class Ui:
             elif self.building0.y > 0:
                 y_mov = -1 * max(self.building1.y / 6, 1) # Slowly pushes queue up
             self.building0.move(down = y_mov, lock = True, max_w = self.building_frame.w, max_h = self.building_frame.h)
-            self.building1.y = self.building0.y + self.building0.h + 5
-            self.building2.y = self.building1.y + self.building1.h + 5
+            space = 5 * self.W / BASE_WIDTH # Between two buildings
+            self.building1.y = self.building0.y + self.building0.h + space
+            self.building2.y = self.building1.y + self.building1.h + space
 
     async def event_city_menu(self, event: pygame.event) -> None:
         """ Manage user event in the city menu """
         if self.current_menu == self.CITY:
 
+            image, build = self.hit()
             if event.type == pygame.MOUSEBUTTONDOWN:
-                if self.building_frame.collide(self.mouse) and self.starting_position == (0, 0):
+                if image is self.building_frame and self.starting_position == (0, 0):
                     self.starting_position = self.mouse
 
             if event.type == pygame.MOUSEBUTTONUP:
                 self.starting_position = (0, 0)
-                self.game.increment_house(self.house_plus.collide(self.mouse))
-                self.game.increment_granary(self.granary_plus.collide(self.mouse))
-                self.game.increment_storage(self.storage_plus.collide(self.mouse))
+                if build != None:
+                    build(True, self.game.max_buildings if event.button == BUY_MAX_BUTTON else 1)
 
     async def draw_city_menu(self) -> None:
         """ Draw button in the city menu """
         if self.current_menu == self.CITY:
 
-            self.building_frame.change()
-
             house_enabled = (self.game.wood >= self.game.house_cost() and self.game.events.count_type("Building") < 3)
             self.house_plus.change(assets.RIGHT_ARROW_PLUS if house_enabled else assets.RIGHT_ARROW_PLUS_DISABLED)
-            self.square_house.draw(self.display, text = int(self.game.house))
-            self.house_cost.draw(self.display, text = self.game.format_house_cost())
-            self.house_plus.draw(self.display)
+            self.square_house.draw(self.scene, text = int(self.game.house))
+            self.house_cost.draw(self.scene, text = self.game.format_house_cost())
+            self.house_plus.draw(self.scene)
 
             granary_enabled = (self.game.wood >= self.game.granary_cost() and self.game.events.count_type("Building") < 3)
             self.granary_plus.change(assets.RIGHT_ARROW_PLUS if granary_enabled else assets.RIGHT_ARROW_PLUS_DISABLED)
-            self.square_granary.draw(self.display, text = int(self.game.granary))
-            self.granary_cost.draw(self.display, text = self.game.format_granary_cost())
-            self.granary_plus.draw(self.display)
+            self.square_granary.draw(self.scene, text = int(self.game.granary))
+            self.granary_cost.draw(self.scene, text = self.game.format_granary_cost())
+            self.granary_plus.draw(self.scene)
 
             storage_enabled = (self.game.wood >= self.game.storage_cost() and self.game.events.count_type("Building") < 3)
             self.storage_plus.change(assets.RIGHT_ARROW_PLUS if storage_enabled else assets.RIGHT_ARROW_PLUS_DISABLED)
-            self.square_storage.draw(self.display, text = int(self.game.storage))
-            self.storage_cost.draw(self.display, text = self.game.format_storage_cost())
-            self.storage_plus.draw(self.display)
-
-            if self.game.events.exist_type("Building"):
+            self.square_storage.draw(self.scene, text = int(self.game.storage))
+            self.storage_cost.draw(self.scene, text = self.game.format_storage_cost())
+            self.storage_plus.draw(self.scene)
+
+            # Building queue is drawn on a copy of the frame, only when it changes so the scene sees the same surface
+            buildings = self.game.events.buildings()[:3]
+            shown = (self.building_frame, tuple((building.name, building.format_lasting_time()) for building in buildings), self.building0.y)
+            if shown != self.building_frame_shown:
+                self.building_frame.change(writable = True)
                 image = {
                     "House": self.house,
                     "Granary": self.granary,
                     "Storage": self.storage
                 }
-
-                if len(self.game.events.buildings()) > 0:
-                    self.building0.change()
-                    building0 = self.game.events.buildings()[0]
-                    image[building0.name].draw(self.building0.picture)
-                    self.building0.draw(self.building_frame.picture, text = building0.format_lasting_time())
-                if len(self.game.events.buildings()) > 1:
-                    self.building1.change()
-                    building1 = self.game.events.buildings()[1]
-                    image[building1.name].draw(self.building1.picture)
-                    self.building1.draw(self.building_frame.picture, text = building1.format_lasting_time())
-                if len(self.game.events.buildings()) > 2:
-                    self.building2.change()
-                    building2 = self.game.events.buildings()[2]
-                    image[building2.name].draw(self.building2.picture)
-                    self.building2.draw(self.building_frame.picture, text = building2.format_lasting_time())
-
-                self.building_frame.draw(self.display)
\ No newline at end of file
+                for slot, building in zip((self.building0, self.building1, self.building2), buildings):
+                    slot.change(writable = True)
+                    image[building.name].draw(slot.picture)
+                    slot.draw(self.building_frame.picture, text = building.format_lasting_time())
+                self.building_frame_shown = shown
+            if len(buildings) > 0:
+                self.building_frame.draw(self.scene)
\ No newline at end of file